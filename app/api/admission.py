@@ -0,0 +1,157 @@
+import math
+import time
+from fastapi import HTTPException
+from app.config import config
+from app.models import ApiKey
+from .cache import TTLCache, MISSING
+from .metrics import ADMISSION_REJECTIONS
+from .queue_stats import queue_stats, QueueStats
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Takes `tokens` from the bucket if available.
+
+        A request larger than the capacity is admitted once the bucket is full and leaves it in debt,
+        so the requests after it wait until the deficit is refilled and the rate is kept over time.
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds to wait until they are available.
+        """
+        self._refill()
+        needed = min(tokens, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= tokens
+            return 0
+        return (needed - self.tokens) / self.rate
+
+    def refund(self, tokens: float) -> None:
+        """Gives back tokens of a request that was not carried out."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+
+class RateLimiter:
+    """Token bucket rate limit per API key."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        # An idle bucket refills completely, so it can be forgotten after that time
+        self._buckets: TTLCache[int, TokenBucket] = TTLCache(
+            maxsize=max_keys, ttl=burst / self.rate
+        )
+
+    def try_acquire(self, key_id: int, tokens: int = 1) -> float:
+        bucket = self._buckets.get(key_id)
+        if bucket is MISSING:
+            bucket = TokenBucket(self.rate, self.burst)
+        # Refresh the TTL on every use
+        self._buckets.set(key_id, bucket)
+        return bucket.try_acquire(tokens)
+
+    def refund(self, key_id: int, tokens: int = 1) -> None:
+        bucket = self._buckets.get(key_id)
+        if bucket is not MISSING:
+            bucket.refund(tokens)
+
+
+class AdmissionController:
+    """Rejects submissions over the per-key rate limit or over the maximum backlog of a queue."""
+
+    DEFAULT_RETRY_AFTER = 60  # Seconds, when the throughput of a queue is unknown
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        stats: QueueStats,
+        max_backlog: dict[str, int],
+        default_max_backlog: int | None = None,
+    ):
+        self.rate_limiter = rate_limiter
+        self.stats = stats
+        self.max_backlog = max_backlog
+        self.default_max_backlog = default_max_backlog
+
+    def get_max_backlog(self, queue: str) -> int | None:
+        return self.max_backlog.get(queue, self.default_max_backlog)
+
+    def admit(self, key: ApiKey, jobs_per_queue: dict[str, int]) -> None:
+        """
+        Admits the jobs and counts them in the cached queue depths.
+
+        Raises:
+            HTTPException: 429 with a Retry-After header if the jobs are not admitted.
+        """
+        total = sum(jobs_per_queue.values())
+
+        for queue, count in jobs_per_queue.items():
+            max_backlog = self.get_max_backlog(queue)
+            if max_backlog is None:
+                continue
+            depth = self.stats.depth(queue)
+            if depth + count > max_backlog:
+                ADMISSION_REJECTIONS.labels("backlog", queue).inc()
+                raise self._too_many_requests(
+                    f"Queue {queue} is full ({depth}/{max_backlog} jobs)",
+                    self._estimate_drain_time(queue, depth + count - max_backlog),
+                )
+
+        wait = self.rate_limiter.try_acquire(key.id, total)
+        if wait > 0:
+            for queue in jobs_per_queue:
+                ADMISSION_REJECTIONS.labels("rate_limit", queue).inc()
+            raise self._too_many_requests(
+                f"Rate limit exceeded for API key of {key.owner}", wait
+            )
+
+        for queue, count in jobs_per_queue.items():
+            self.stats.record_deferred(queue, count)
+
+    def release(self, key: ApiKey, jobs_per_queue: dict[str, int]) -> None:
+        """Gives back the admission of jobs that were not deferred, e.g. when the insert failed."""
+        jobs_per_queue = {q: c for q, c in jobs_per_queue.items() if c > 0}
+        if not jobs_per_queue:
+            return
+        self.rate_limiter.refund(key.id, sum(jobs_per_queue.values()))
+        for queue, count in jobs_per_queue.items():
+            self.stats.record_removed(queue, count)
+
+    def _estimate_drain_time(self, queue: str, excess: int) -> float:
+        """Seconds until `excess` jobs are finished at the recent throughput of the queue."""
+        throughput = self.stats.throughput(queue)
+        if throughput <= 0:
+            return self.DEFAULT_RETRY_AFTER
+        return excess / throughput
+
+    def _too_many_requests(self, detail: str, retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+admission = AdmissionController(
+    rate_limiter=RateLimiter(
+        rate_per_minute=config.api.rate_limit_per_minute,
+        burst=config.api.rate_limit_burst,
+    ),
+    stats=queue_stats,
+    max_backlog=config.api.max_queue_backlog,
+    default_max_backlog=config.api.default_max_queue_backlog,
+)
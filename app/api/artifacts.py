@@ -0,0 +1,93 @@
+import zipfile
+from pathlib import Path, PureWindowsPath
+from typing import Any, Iterator
+
+
+class ArtifactNotFoundError(Exception):
+    """Raised when an artifact cannot be found on the share."""
+
+
+def resolve_share_path(
+    worker_path: str, drive_letter: str, share_path: str | Path
+) -> Path | None:
+    """
+    Maps a path written by a worker on the network drive (e.g. Z:\\uploads\\po.xlsx) to the share as mounted
+    on the API host. Returns None for paths outside of the network drive.
+    """
+    path = PureWindowsPath(worker_path)
+    if path.drive.upper() != drive_letter.upper():
+        return None
+
+    parts = path.parts[1:]
+    if not parts or any(part in ("..", ".") for part in parts):
+        return None
+    return Path(share_path).joinpath(*parts)
+
+
+def collect_artifacts(
+    result_data: dict[str, Any], drive_letter: str, share_path: str | Path
+) -> dict[str, Path]:
+    """
+    Collects the output files referenced by a job result: the updated and errors workbooks,
+    and the failure screenshots. Returns a mapping of file name to path on the share.
+    """
+    worker_paths: list[str] = []
+    for key in ("output_path", "error_path"):
+        if result_data.get(key):
+            worker_paths.append(str(result_data[key]))
+    for error in result_data.get("error_list") or []:
+        if isinstance(error, dict) and error.get("screenshot_path"):
+            worker_paths.append(str(error["screenshot_path"]))
+
+    artifacts: dict[str, Path] = {}
+    for worker_path in worker_paths:
+        path = resolve_share_path(worker_path, drive_letter, share_path)
+        if path is not None:
+            artifacts[path.name] = path
+    return artifacts
+
+
+def make_etag(path: Path) -> str:
+    stat = path.stat()
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class _ZipStreamBuffer:
+    """Write-only file object collecting the bytes written by ZipFile until they are taken."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files: dict[str, Path], chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Streams a zip archive of the files. The archive is produced while it is sent,
+    only one chunk of a file is held in memory at a time.
+    """
+    buffer = _ZipStreamBuffer()
+    # The buffer is not seekable, so ZipFile writes data descriptors after each entry
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, path in files.items():
+            with open(path, "rb") as source:
+                with archive.open(name, mode="w", force_zip64=True) as entry:
+                    while chunk := source.read(chunk_size):
+                        entry.write(chunk)
+                        data = buffer.take()
+                        if data:
+                            yield data
+            data = buffer.take()
+            if data:
+                yield data
+    yield buffer.take()
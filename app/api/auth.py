@@ -1,12 +1,37 @@
+import hashlib
 from app.config import config
+from app.db import api_keys as api_keys_db
+from app.models import ApiKey
 from fastapi import Security, HTTPException
 from fastapi.security import APIKeyHeader
+from .cache import TTLCache, MISSING
+from .proc_app import app
 
 api_key_header = APIKeyHeader(name=config.api.key_header, auto_error=True)
 
+# Maps key hashes to their ApiKey, or None for unknown/revoked keys.
+# Revocation propagates within the cache TTL.
+api_key_cache: TTLCache[str, ApiKey | None] = TTLCache(
+    maxsize=config.api.key_cache_size, ttl=config.api.key_cache_ttl
+)
 
-def verify_api_key(api_key: str = Security(api_key_header)):
-    # TODO: Implement API key verification
-    if api_key == "mykey":
-        return api_key
-    raise HTTPException(status_code=401, detail="Missing or incorrect API key")
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+async def verify_api_key(api_key: str = Security(api_key_header)) -> ApiKey:
+    key_hash = hash_api_key(api_key)
+    verified_key = api_key_cache.get(key_hash)
+    if verified_key is MISSING:
+        row = await api_keys_db.get_active_key(app.connector, key_hash)
+        verified_key = ApiKey(**row) if row else None
+        api_key_cache.set(
+            key_hash,
+            verified_key,
+            ttl=None if verified_key else config.api.key_cache_negative_ttl,
+        )
+
+    if verified_key is None:
+        raise HTTPException(status_code=401, detail="Missing or incorrect API key")
+    return verified_key
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from fastapi import FastAPI, Request, HTTPException
@@ -5,7 +6,17 @@ from fastapi.responses import JSONResponse
 from scalar_fastapi import get_scalar_api_reference
 from app.logging import log
 from app.config import config
+from app.db import apply_schema_async
 from .router import api_router
+from .routes import health
+from .proc_app import app as proc_app
+from .events import job_event_hub
+from .metrics import track_request_latency, metrics_response
+from .staging import UploadSizeLimitMiddleware
+from .idempotency import purge_expired_keys_periodically
+from .queue_stats import queue_stats
+from .eta import eta_estimator
+from .validation import task_kwargs_validator
 
 
 @asynccontextmanager
@@ -13,6 +24,25 @@ async def lifespan(app: FastAPI):
     log.info("Starting FastAPI server...")
     try:
         # Initialize resources here
+        task_kwargs_validator.compile(proc_app)
+        await proc_app.open_async()
+        log.info(
+            f"Database pool opened (min={config.db.pool_min_size}, max={config.db.pool_max_size})"
+        )
+        try:
+            await apply_schema_async(proc_app.connector)
+        except Exception as e:
+            log.warning(f"Failed to apply desktop agent schema: {e}")
+        await job_event_hub.start(proc_app.connector)
+        background_tasks = [
+            asyncio.create_task(
+                purge_expired_keys_periodically(
+                    proc_app.connector, config.api.idempotency_purge_interval
+                )
+            ),
+            asyncio.create_task(queue_stats.refresh_periodically(proc_app.connector)),
+            asyncio.create_task(eta_estimator.refresh_periodically(proc_app.connector)),
+        ]
         if config.is_dev:
             log.success(f"Server started at http://localhost:{config.api.port}")
             log.info(f"Documentation at http://localhost:{config.api.port}/docs")
@@ -24,6 +54,11 @@ async def lifespan(app: FastAPI):
     yield
     log.info("Stopping FastAPI server...")
     # Cleanup resources here
+    for task in background_tasks:
+        task.cancel()
+    await job_event_hub.stop()
+    await proc_app.close_async()
+    log.info("Database pool closed")
 
 
 def create_app() -> FastAPI:
@@ -35,8 +70,23 @@ def create_app() -> FastAPI:
         docs_url="/swagger-docs",
     )
 
+    app.middleware("http")(track_request_latency)
+    # Uploads are spooled before the route runs, their size is limited while they are received
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        paths={f"{config.api.prefix}/sales-orders/upload"},
+        max_body_size=config.api.upload_max_size + config.api.upload_form_max_size,
+    )
+
     # Register routers here
     app.include_router(api_router, prefix=config.api.prefix)
+    # Probes are outside of the API prefix for the load balancer
+    app.include_router(health.router, tags=["Health"])
+
+    # Prometheus metrics
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return metrics_response()
 
     # Docs
     @app.get("/docs", include_in_schema=False)
@@ -69,6 +119,7 @@ def create_app() -> FastAPI:
                 "message": exc.detail,
                 "status_code": exc.status_code,
             },
+            headers=exc.headers,
         )
 
     @app.exception_handler(Exception)
@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from procrastinate.connector import BaseConnector
+from app.config import config
+from app.db import timings as timings_db
+from app.db import workers as workers_db
+from app.logging import log
+
+
+@dataclass
+class TaskTimings:
+    job_seconds: float  # Fixed time per job
+    unit_seconds: float | None = None  # Time per unit of work
+    units_per_job: float | None = None
+
+    def predict(self, units: int | None) -> float:
+        """Predicted run time of a job, from its units when known, otherwise from the average units per job."""
+        if self.unit_seconds is None:
+            return self.job_seconds
+        if units is None:
+            units = self.units_per_job or 0
+        return self.job_seconds + units * self.unit_seconds
+
+
+@dataclass
+class JobEta:
+    job_id: int
+    queue: str
+    task_name: str
+    status: str
+    position: int  # 0 for the running job of the queue
+    units: int | None
+    predicted_seconds: float
+    estimated_start: datetime
+    estimated_finish: datetime
+
+
+class EtaEstimator:
+    """
+    Estimated start and finish times of the waiting jobs, recomputed every `refresh_interval` seconds.
+
+    Each live worker host listening to a queue is a lane running its jobs one at a time, as a desktop
+    drives a single SAP GUI, so each job starts when the first lane of its queue is predicted to be free.
+    The run time of a job is predicted from the timings aggregate of its task and its number of units
+    (e.g. sales orders).
+    The computation is a single pass over the waiting jobs, and requests are served from the last computation.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = 10.0,
+        default_job_seconds: float = 300.0,
+        heartbeat_timeout: float = 60.0,
+    ):
+        self.refresh_interval = refresh_interval
+        self.default_job_seconds = default_job_seconds
+        self.heartbeat_timeout = heartbeat_timeout
+        self.computed_at: datetime | None = None
+        self._estimates: dict[int, JobEta] = {}
+        self._lane_ends: dict[str, list[datetime]] = {}  # Heap per queue
+        self._lane_counts: dict[str, int] = {}
+        self._queue_sizes: dict[str, int] = {}
+        self._timings: dict[str, TaskTimings] = {}
+
+    def get(self, job_id: int) -> JobEta | None:
+        return self._estimates.get(job_id)
+
+    def list_estimates(self, queue: str | None = None) -> list[JobEta]:
+        return [
+            eta
+            for eta in self._estimates.values()
+            if queue is None or eta.queue == queue
+        ]
+
+    def predict(self, task_name: str, units: int | None) -> float:
+        timings = self._timings.get(task_name)
+        if timings is None:
+            return self.default_job_seconds
+        return timings.predict(units)
+
+    def estimate_appended(
+        self, job: dict[str, Any], units: int | None = None
+    ) -> JobEta:
+        """Estimates a waiting job deferred after the last computation, as if it were last in its queue."""
+        now = datetime.now(timezone.utc)
+        queue = job["queue"]
+        start = max(self._next_free_lane(queue, now), now)
+        if job.get("scheduled_at") is not None:
+            start = max(start, job["scheduled_at"])
+        predicted = self.predict(job["task_name"], units)
+        return JobEta(
+            job_id=job["id"],
+            queue=job["queue"],
+            task_name=job["task_name"],
+            status=job["status"],
+            position=self._queue_sizes.get(queue, 0),
+            units=units,
+            predicted_seconds=predicted,
+            estimated_start=start,
+            estimated_finish=start + timedelta(seconds=predicted),
+        )
+
+    async def refresh(self, connector: BaseConnector) -> None:
+        self._timings = {
+            row["task_name"]: TaskTimings(
+                job_seconds=row["job_seconds"],
+                unit_seconds=row["unit_seconds"],
+                units_per_job=row["units_per_job"],
+            )
+            for row in await timings_db.get_task_timings(connector)
+        }
+        workers = await workers_db.get_live_workers(connector, self.heartbeat_timeout)
+        jobs = await timings_db.get_queued_jobs(connector)
+        self._compute(jobs, datetime.now(timezone.utc), count_lanes(workers, jobs))
+
+    def _next_free_lane(self, queue: str, now: datetime) -> datetime:
+        lane_ends = self._lane_ends.get(queue, [])
+        if len(lane_ends) < self._lane_counts.get(queue, 1):
+            return now
+        return lane_ends[0]
+
+    def _compute(
+        self,
+        jobs: list[dict[str, Any]],
+        now: datetime,
+        lane_counts: dict[str, int] | None = None,
+    ) -> None:
+        """Walks the jobs once, running jobs first then in fetch order, giving each job the first free lane."""
+        lane_counts = lane_counts or {}
+        estimates: dict[int, JobEta] = {}
+        lane_ends: dict[str, list[datetime]] = {}
+        positions: dict[str, int] = {}
+        for job in jobs:
+            queue = job["queue"]
+            ends = lane_ends.setdefault(queue, [])
+            predicted = self.predict(job["task_name"], job["units"])
+            if job["status"] == "doing":
+                start = job["started_at"] or now
+                finish = max(start + timedelta(seconds=predicted), now)
+            else:
+                start = now
+                if len(ends) >= lane_counts.get(queue, 1):
+                    start = max(heapq.heappop(ends), now)
+                if job["scheduled_at"] is not None:
+                    start = max(start, job["scheduled_at"])
+                finish = start + timedelta(seconds=predicted)
+
+            estimates[job["id"]] = JobEta(
+                job_id=job["id"],
+                queue=job["queue"],
+                task_name=job["task_name"],
+                status=job["status"],
+                position=positions.get(queue, 0),
+                units=job["units"],
+                predicted_seconds=predicted,
+                estimated_start=start,
+                estimated_finish=finish,
+            )
+            heapq.heappush(ends, finish)
+            positions[queue] = positions.get(queue, 0) + 1
+
+        self._estimates = estimates
+        self._lane_ends = lane_ends
+        self._lane_counts = lane_counts
+        self._queue_sizes = positions
+        self.computed_at = now
+
+    async def refresh_periodically(self, connector: BaseConnector) -> None:
+        """Recomputes the estimates every `refresh_interval` seconds. Runs until cancelled."""
+        while True:
+            started_at = time.monotonic()
+            try:
+                await self.refresh(connector)
+                log.debug(
+                    f"Computed {len(self._estimates)} job estimates in {time.monotonic() - started_at:.3f}s"
+                )
+            except Exception as e:
+                log.warning(f"Failed to compute job estimates: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+def count_lanes(
+    workers: list[dict[str, Any]], jobs: list[dict[str, Any]]
+) -> dict[str, int]:
+    """Number of live worker hosts listening to each queue of the jobs, at least one."""
+    hosts: dict[str, set[str]] = {job["queue"]: set() for job in jobs}
+    for worker in workers:
+        for queue, queue_hosts in hosts.items():
+            # No queues means all queues
+            if worker["queues"] is None or queue in worker["queues"]:
+                queue_hosts.add(worker["hostname"])
+    return {queue: max(1, len(queue_hosts)) for queue, queue_hosts in hosts.items()}
+
+
+eta_estimator = EtaEstimator(
+    refresh_interval=config.api.eta_refresh_interval,
+    default_job_seconds=config.api.eta_default_job_seconds,
+    heartbeat_timeout=config.api.worker_heartbeat_timeout,
+)
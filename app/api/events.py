@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+from typing import Any
+from procrastinate.connector import BaseConnector
+from app.config import config
+from app.db.schema import JOB_EVENTS_CHANNEL
+from app.logging import log
+from app.models import ApiKey
+
+
+class TooManySubscribersError(Exception):
+    """Raised when the maximum number of event subscribers is reached."""
+
+
+class Subscription:
+    """A subscriber of the job events hub with its own bounded queue of events."""
+
+    def __init__(
+        self,
+        queues: set[str] | None = None,
+        job_ids: set[int] | None = None,
+        max_queue_size: int = 100,
+        key: ApiKey | None = None,
+    ):
+        self.queues = queues
+        self.job_ids = job_ids
+        self.key = key  # Only the events of the jobs the key may read are delivered
+        self.events: asyncio.Queue[dict[str, Any]] = asyncio.Queue(
+            maxsize=max_queue_size
+        )
+        self.dropped = 0
+
+    def matches(self, event: dict[str, Any]) -> bool:
+        if self.queues and event.get("queue") not in self.queues:
+            return False
+        if self.job_ids and event.get("job_id") not in self.job_ids:
+            return False
+        if self.key is not None and not self.key.can_read(
+            event.get("task_name"), event.get("queue")
+        ):
+            return False
+        return True
+
+    def push(self, event: dict[str, Any]) -> None:
+        """Queues an event without blocking. The oldest event is dropped for slow subscribers."""
+        if self.events.full():
+            self.events.get_nowait()
+            self.dropped += 1
+        self.events.put_nowait(event)
+
+
+class JobEventHub:
+    """
+    Fans out job status notifications to all subscribers.
+
+    A single LISTEN connection is shared by every subscriber, so the number of clients does not
+    change the number of database connections. The listener is restarted with an exponential backoff
+    of up to `retry_max_delay` seconds when it fails; in between, `listener_error` tells why.
+    """
+
+    def __init__(
+        self,
+        max_subscribers: int = 1000,
+        subscriber_queue_size: int = 100,
+        retry_max_delay: float = 30.0,
+    ):
+        self.max_subscribers = max_subscribers
+        self.subscriber_queue_size = subscriber_queue_size
+        self.retry_max_delay = retry_max_delay
+        self._subscriptions: set[Subscription] = set()
+        self._listen_task: asyncio.Task | None = None
+        self._listener_error: str | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    @property
+    def listener_error(self) -> str | None:
+        """Why job events are not received at the moment, or None while the listener runs."""
+        if self._listen_task is None:
+            return "listener is not started"
+        if self._listen_task.done():
+            return self._listener_error or "listener stopped"
+        return self._listener_error
+
+    async def start(self, connector: BaseConnector) -> None:
+        if self._listen_task is not None:
+            return
+        self._listen_task = asyncio.create_task(
+            self._listen(connector), name="job-events-listener"
+        )
+        self._listen_task.add_done_callback(self._on_listener_done)
+        log.info(f"Listening for job events on channel {JOB_EVENTS_CHANNEL}")
+
+    async def _listen(self, connector: BaseConnector) -> None:
+        delay = 1.0
+        while True:
+            started_at = time.monotonic()
+            self._listener_error = None
+            try:
+                await connector.listen_notify(
+                    on_notification=self._on_notification,
+                    channels=[JOB_EVENTS_CHANNEL],
+                )
+                self._listener_error = "listener returned"
+            except Exception as e:
+                self._listener_error = f"listener failed: {e!r}"
+
+            # A listener that ran for a while failed for a new reason: retry quickly
+            if time.monotonic() - started_at > self.retry_max_delay:
+                delay = 1.0
+            log.error(
+                f"Job events {self._listener_error}, restarting in {delay:.0f} seconds"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max_delay)
+
+    async def stop(self) -> None:
+        if self._listen_task is None:
+            return
+        self._listen_task.cancel()
+        try:
+            await self._listen_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._listen_task = None
+        log.info("Stopped listening for job events")
+
+    def _on_listener_done(self, task: asyncio.Task) -> None:
+        # `_listen` restarts the listener on errors, it only ends when cancelled or on a fatal error
+        if not task.cancelled() and task.exception():
+            self._listener_error = f"listener stopped: {task.exception()!r}"
+            log.error(f"Job events listener stopped: {task.exception()}")
+
+    async def _on_notification(self, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except json.JSONDecodeError:
+            log.warning(f"Invalid job event payload: {payload}")
+            return
+
+        for subscription in self._subscriptions:
+            if subscription.matches(event):
+                subscription.push(event)
+
+    def subscribe(
+        self,
+        queues: set[str] | None = None,
+        job_ids: set[int] | None = None,
+        key: ApiKey | None = None,
+    ) -> Subscription:
+        """
+        Subscribes to job events, optionally filtered by queues and/or job ids, and to the jobs `key` may read.
+        The subscription must be released with `unsubscribe`.
+
+        Raises:
+            TooManySubscribersError: If the maximum number of subscribers is reached.
+        """
+        if len(self._subscriptions) >= self.max_subscribers:
+            raise TooManySubscribersError(
+                f"Maximum number of subscribers ({self.max_subscribers}) reached"
+            )
+
+        subscription = Subscription(
+            queues=queues,
+            job_ids=job_ids,
+            max_queue_size=self.subscriber_queue_size,
+            key=key,
+        )
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+
+job_event_hub = JobEventHub(
+    max_subscribers=config.api.events_max_subscribers,
+    subscriber_queue_size=config.api.events_subscriber_queue_size,
+    retry_max_delay=config.api.events_listener_retry_max_delay,
+)
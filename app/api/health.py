@@ -0,0 +1,172 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Literal
+from procrastinate import App
+from app.config import config
+from app.db import workers as workers_db
+from app.logging import log
+from .events import job_event_hub
+from .proc_app import app as proc_app
+
+HealthStatus = Literal["ok", "degraded", "unavailable"]
+
+
+class ReadinessChecker:
+    """
+    Checks the database, the worker heartbeats of every queue and the job events listener, and caches
+    the report for `ttl` seconds.
+
+    Concurrent probes share the same check, so the database sees at most two queries per TTL
+    however often the load balancer probes.
+    """
+
+    def __init__(
+        self,
+        app: App,
+        ttl: float = 5.0,
+        db_timeout: float = 2.0,
+        heartbeat_timeout: float = 60.0,
+        queues: list[str] | None = None,
+    ):
+        self.app = app
+        self.ttl = ttl
+        self.db_timeout = db_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self._queues = queues
+        self._report: dict[str, Any] | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def queues(self) -> list[str]:
+        """Queues that need a live worker, by default the queues of the declared tasks."""
+        if self._queues is not None:
+            return self._queues
+        # procrastinate's builtin tasks are only deferred on demand
+        return sorted(
+            {
+                task.queue
+                for task in self.app.tasks.values()
+                if not task.name.startswith("builtin:")
+            }
+        )
+
+    async def get_report(self) -> dict[str, Any]:
+        if self._is_fresh():
+            return self._report
+        async with self._lock:
+            # Another probe may have refreshed the report while this one was waiting
+            if not self._is_fresh():
+                self._report = await self._check()
+                self._checked_at = time.monotonic()
+        return self._report
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._report is not None and time.monotonic() - self._checked_at < self.ttl
+        )
+
+    async def _check(self) -> dict[str, Any]:
+        checks: list[dict[str, Any]] = []
+        try:
+            await asyncio.wait_for(
+                workers_db.ping(self.app.connector), timeout=self.db_timeout
+            )
+            checks.append({"name": "database", "status": "ok", "message": None})
+        except Exception as e:
+            log.warning(f"Readiness check: database is unreachable: {e!r}")
+            checks.append(
+                {
+                    "name": "database",
+                    "status": "fail",
+                    "message": f"database is unreachable: {e!r}",
+                }
+            )
+            # Workers cannot be checked without the database
+            return self._build_report("unavailable", checks, workers=[])
+
+        try:
+            workers = await asyncio.wait_for(
+                workers_db.get_live_workers(self.app.connector, self.heartbeat_timeout),
+                timeout=self.db_timeout,
+            )
+        except Exception as e:
+            log.warning(f"Readiness check: failed to read worker heartbeats: {e!r}")
+            checks.append(
+                {
+                    "name": "workers",
+                    "status": "fail",
+                    "message": f"failed to read worker heartbeats: {e!r}",
+                }
+            )
+            return self._build_report("degraded", checks, workers=[])
+
+        degraded = False
+        for queue in self.queues:
+            # A worker without queues listens to every queue
+            live = sum(
+                1
+                for worker in workers
+                if worker["queues"] is None or queue in worker["queues"]
+            )
+            if live:
+                checks.append(
+                    {
+                        "name": f"queue:{queue}",
+                        "status": "ok",
+                        "message": f"{live} live worker(s)",
+                    }
+                )
+            else:
+                degraded = True
+                checks.append(
+                    {
+                        "name": f"queue:{queue}",
+                        "status": "fail",
+                        "message": f"{queue} queue has no live worker",
+                    }
+                )
+
+        # Job event streams and long-polls get no events without the listener
+        listener_error = job_event_hub.listener_error
+        if listener_error is None:
+            checks.append({"name": "job_events", "status": "ok", "message": None})
+        else:
+            degraded = True
+            checks.append(
+                {"name": "job_events", "status": "fail", "message": listener_error}
+            )
+
+        return self._build_report("degraded" if degraded else "ok", checks, workers)
+
+    def _build_report(
+        self,
+        status: HealthStatus,
+        checks: list[dict[str, Any]],
+        workers: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        return {
+            "status": status,
+            "checks": checks,
+            "workers": [
+                {
+                    "hostname": worker["hostname"],
+                    "pid": worker["pid"],
+                    "name": worker["name"],
+                    "queues": worker["queues"],
+                    "last_heartbeat": worker["last_heartbeat"],
+                }
+                for worker in workers
+            ],
+            "checked_at": datetime.now(timezone.utc),
+        }
+
+
+readiness_checker = ReadinessChecker(
+    app=proc_app,
+    ttl=config.api.health_cache_ttl,
+    db_timeout=config.api.health_db_timeout,
+    heartbeat_timeout=config.api.worker_heartbeat_timeout,
+    queues=config.api.ready_queues,
+)
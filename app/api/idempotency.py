@@ -0,0 +1,28 @@
+import asyncio
+import hashlib
+import json
+from typing import Any
+from procrastinate.connector import BaseConnector
+from app.db import idempotency as idempotency_db
+from app.logging import log
+
+
+def hash_request(payload: dict[str, Any]) -> str:
+    """Stable hash of a request payload, used to detect a key reused with a different request."""
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+async def purge_expired_keys_periodically(
+    connector: BaseConnector, interval: float
+) -> None:
+    """Deletes expired idempotency keys every `interval` seconds. Runs until cancelled."""
+    while True:
+        try:
+            count = await idempotency_db.purge_expired_keys(connector)
+            if count:
+                log.info(f"Purged {count} expired idempotency keys")
+        except Exception as e:
+            log.warning(f"Failed to purge expired idempotency keys: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,115 @@
+import time
+from typing import Iterable
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from procrastinate import exceptions as procrastinate_exceptions
+from .proc_app import app as proc_app
+from .queue_stats import queue_stats, QueueStats
+
+
+REQUEST_LATENCY = Histogram(
+    "desktop_agent_http_request_duration_seconds",
+    "Latency of HTTP requests by route",
+    ["method", "route", "status"],
+)
+
+DEFER_LATENCY = Histogram(
+    "desktop_agent_defer_duration_seconds",
+    "Time spent inserting jobs in the database",
+    ["mode"],
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "desktop_agent_admission_rejections_total",
+    "Job submissions rejected by admission control",
+    ["reason", "queue"],
+)
+
+
+class StateCollector(Collector):
+    """
+    Exposes the database pool and the cached queue depths at scrape time.
+
+    Everything is read from memory: the pool statistics are kept by psycopg and the queue depths
+    are refreshed in the background by `QueueStats`, so a scrape never queries the database.
+    """
+
+    def __init__(self, stats: QueueStats):
+        self.stats = stats
+
+    def collect(self) -> Iterable[Metric]:
+        yield from self._collect_pool()
+        yield from self._collect_queues()
+
+    def _collect_pool(self) -> Iterable[Metric]:
+        try:
+            pool_stats = proc_app.connector.pool.get_stats()
+        except procrastinate_exceptions.AppNotOpen:
+            return
+
+        for name, key, documentation in (
+            ("size", "pool_size", "Open connections in the database pool"),
+            ("available", "pool_available", "Idle connections in the database pool"),
+            ("max", "pool_max", "Maximum connections in the database pool"),
+            ("waiting", "requests_waiting", "Requests waiting for a connection"),
+        ):
+            yield GaugeMetricFamily(
+                f"desktop_agent_db_pool_{name}",
+                documentation,
+                value=pool_stats.get(key, 0),
+            )
+        yield CounterMetricFamily(
+            "desktop_agent_db_pool_requests_errors",
+            "Connection requests that failed or timed out",
+            value=pool_stats.get("requests_errors", 0),
+        )
+
+    def _collect_queues(self) -> Iterable[Metric]:
+        jobs = GaugeMetricFamily(
+            "desktop_agent_queue_jobs",
+            "Jobs in each procrastinate queue by status, from the cached queue stats",
+            labels=["queue", "status"],
+        )
+        for queue, state in self.stats.queues.items():
+            jobs.add_metric([queue, "todo"], state.todo)
+            jobs.add_metric([queue, "doing"], state.doing)
+        yield jobs
+
+        if self.stats.refreshed_at is not None:
+            yield GaugeMetricFamily(
+                "desktop_agent_queue_stats_age_seconds",
+                "Seconds since the queue stats were refreshed from the database",
+                value=time.monotonic() - self.stats.refreshed_at,
+            )
+
+
+REGISTRY.register(StateCollector(queue_stats))
+
+
+async def track_request_latency(request: Request, call_next) -> Response:
+    """Middleware observing the latency of every request, labelled by route template."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Unmatched paths share one label so that scanners cannot inflate the cardinality
+        path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path, str(status_code)).observe(
+            time.perf_counter() - start
+        )
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
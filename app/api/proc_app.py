@@ -1,19 +1,30 @@
 """This procrastinate app is needed just for deferring jobs in the right queue with right lock. Do not use this app to define your tasks. You must only declare your tasks in this file.
 
 Note: All the tasks must be first declared here with appropriate locks and queues, and their definition in the worker.tasks module
+The type hints of the declarations are used to validate the job kwargs before deferring, see app.api.validation.
 """
 
 import asyncio
 import sys
-from typing import Any
 from procrastinate import App, PsycopgConnector, JobContext
 from app.config import config
+from app.models import VA01Details, ScreenOrderItem
 
 # Set event loop policy only on Windows
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-app = App(connector=PsycopgConnector(conninfo=config.db.url))
+# The pool is opened once in the FastAPI lifespan and shared by all requests
+app = App(
+    connector=PsycopgConnector(
+        conninfo=config.db.url,
+        min_size=config.db.pool_min_size,
+        max_size=config.db.pool_max_size,
+        timeout=config.db.pool_timeout,
+        max_idle=config.db.pool_max_idle,
+        max_lifetime=config.db.pool_max_lifetime,
+    )
+)
 
 
 @app.task(
@@ -27,12 +38,13 @@ def add(context: JobContext, a: int, b: int): ...
 @app.task(
     name="create_sales_orders",
     queue="sap",
-    lock="sap",
+    lock=config.sap.job_lock,
     pass_context=True,
 )
 def create_sales_orders(
     context: JobContext,
     po_working_path: str,
-    va01_details: dict[str, Any],
-    screen_order: list[dict[str, Any]],
+    va01_details: VA01Details,
+    screen_order: list[ScreenOrderItem],
+    chunk_size: int | None = None,
 ): ...
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from procrastinate.connector import BaseConnector
+from app.config import config
+from app.db import queues as queues_db
+from app.logging import log
+
+
+@dataclass
+class QueueState:
+    todo: int = 0
+    doing: int = 0
+    finished_in_window: int = 0
+
+
+class QueueStats:
+    """
+    Cached depth and recent throughput of every procrastinate queue.
+
+    The counters are refreshed from the database every `refresh_interval` seconds by a background task,
+    and incremented locally when the API defers jobs in between, so that requests never count rows.
+    """
+
+    def __init__(self, refresh_interval: float = 5.0, throughput_window: float = 900.0):
+        self.refresh_interval = refresh_interval
+        self.throughput_window = throughput_window
+        self.refreshed_at: float | None = None
+        self._queues: dict[str, QueueState] = {}
+
+    def get(self, queue: str) -> QueueState:
+        return self._queues.get(queue, QueueState())
+
+    @property
+    def queues(self) -> dict[str, QueueState]:
+        return dict(self._queues)
+
+    def depth(self, queue: str) -> int:
+        """Jobs waiting or running in the queue."""
+        state = self.get(queue)
+        return state.todo + state.doing
+
+    def throughput(self, queue: str) -> float:
+        """Jobs finished per second in the queue over the throughput window."""
+        return self.get(queue).finished_in_window / self.throughput_window
+
+    def record_deferred(self, queue: str, count: int = 1) -> None:
+        self._queues.setdefault(queue, QueueState()).todo += count
+
+    def record_removed(self, queue: str, count: int = 1) -> None:
+        """Counts waiting jobs removed from the queue, e.g. cancelled."""
+        state = self._queues.get(queue)
+        if state is not None:
+            state.todo = max(0, state.todo - count)
+
+    async def refresh(self, connector: BaseConnector) -> None:
+        depths = await queues_db.get_queue_depths(connector)
+        throughput = await queues_db.get_queue_throughput(
+            connector, self.throughput_window
+        )
+
+        queues: dict[str, QueueState] = {}
+        for row in depths:
+            queues[row["queue"]] = QueueState(todo=row["todo"], doing=row["doing"])
+        for row in throughput:
+            queues.setdefault(row["queue"], QueueState()).finished_in_window = row[
+                "finished"
+            ]
+        self._queues = queues
+        self.refreshed_at = time.monotonic()
+
+    async def refresh_periodically(self, connector: BaseConnector) -> None:
+        """Refreshes the counters every `refresh_interval` seconds. Runs until cancelled."""
+        while True:
+            try:
+                await self.refresh(connector)
+            except Exception as e:
+                log.warning(f"Failed to refresh queue stats: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+queue_stats = QueueStats(
+    refresh_interval=config.api.queue_stats_refresh_interval,
+    throughput_window=config.api.queue_stats_throughput_window,
+)
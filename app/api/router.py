@@ -1,5 +1,8 @@
 from fastapi import APIRouter
-from .routes import jobs
+from .routes import jobs, sales_orders
 
 api_router = APIRouter()
 api_router.include_router(jobs.router, prefix="/jobs", tags=["Job Queue"])
+api_router.include_router(
+    sales_orders.router, prefix="/sales-orders", tags=["Sales Orders"]
+)
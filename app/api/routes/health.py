@@ -0,0 +1,61 @@
+import time
+from datetime import datetime
+from fastapi import APIRouter, Response, status
+from pydantic import BaseModel
+from app.api.health import readiness_checker, HealthStatus
+from typing import Literal
+
+router = APIRouter()
+
+STARTED_AT = time.monotonic()
+
+
+class HealthResponse(BaseModel):
+    status: Literal["ok"] = "ok"
+    uptime: float  # Seconds
+
+
+class HealthCheck(BaseModel):
+    name: str  # "database", "workers" or "queue:<name>"
+    status: Literal["ok", "fail"]
+    message: str | None = None
+
+
+class WorkerHeartbeat(BaseModel):
+    hostname: str
+    pid: int
+    name: str | None = None
+    queues: list[str] | None = None  # None means all queues
+    last_heartbeat: datetime
+
+
+class ReadinessResponse(BaseModel):
+    status: HealthStatus
+    checks: list[HealthCheck]
+    workers: list[WorkerHeartbeat]
+    checked_at: datetime
+
+
+@router.get(
+    "/healthz",
+    response_model=HealthResponse,
+    description="Liveness probe, does not touch the database",
+)
+async def healthz():
+    return {"status": "ok", "uptime": time.monotonic() - STARTED_AT}
+
+
+@router.get(
+    "/readyz",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse}},
+    description=(
+        "Readiness probe. Returns 503 when the database is unreachable and reports queues without a live "
+        "worker, or a stopped job events listener, as degraded. The result is cached for a few seconds."
+    ),
+)
+async def readyz(response: Response):
+    report = await readiness_checker.get_report()
+    if report["status"] == "unavailable":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
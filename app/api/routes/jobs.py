@@ -1,8 +1,39 @@
-from fastapi import APIRouter, status, Depends
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from fastapi import (
+    APIRouter,
+    status,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    Header,
+)
+from fastapi.responses import StreamingResponse, FileResponse
+from app.api.admission import admission
+from app.api.artifacts import collect_artifacts, make_etag, iter_zip
 from app.api.auth import verify_api_key
+from app.api.eta import eta_estimator
+from app.api.events import job_event_hub, Subscription, TooManySubscribersError
+from app.api.idempotency import hash_request
+from app.api.metrics import DEFER_LATENCY
+from app.api.validation import task_kwargs_validator, format_validation_error
 from app.api.proc_app import app
-from pydantic import BaseModel
-from typing import Any
+from app.api.queue_stats import queue_stats
+from app.config import config
+from app.db import jobs as jobs_db
+from app.db import results as results_db
+from app.db import idempotency as idempotency_db
+from app.db import submissions as submissions_db
+from app.logging import log
+from app.models import JobResult, ApiKey
+from pydantic import BaseModel, ValidationError
+from procrastinate.exceptions import TaskNotFound
+from procrastinate.jobs import Job, DEFAULT_QUEUE
+from typing import Any, Literal
 
 router = APIRouter()
 
@@ -21,24 +52,762 @@ class JobResponse(BaseModel):
     job_id: int
 
 
+class JobEvent(BaseModel):
+    type: str
+    at: datetime | None = None
+
+
+class JobDetails(BaseModel):
+    id: int
+    queue: str
+    task_name: str
+    status: str
+    priority: int
+    lock: str | None = None
+    queueing_lock: str | None = None
+    kwargs: dict[str, Any]
+    attempts: int
+    scheduled_at: datetime | None = None
+    worker_id: int | None = None
+    submitter: str | None = None
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    events: list[JobEvent] | None = None
+    result: JobResult | None = None
+
+
+class JobListResponse(BaseModel):
+    items: list[JobDetails]
+    next_cursor: int | None = None
+
+
+class JobWaitResponse(BaseModel):
+    done: bool
+    timed_out: bool
+    job: JobDetails
+
+
+class Artifact(BaseModel):
+    name: str
+    size: int
+    etag: str
+
+
+class JobArtifactsResponse(BaseModel):
+    job_id: int
+    artifacts: list[Artifact]
+
+
+JobStatus = Literal["todo", "doing", "succeeded", "failed", "cancelled", "aborted"]
+
+
+FINAL_STATUSES = {"succeeded", "failed", "cancelled", "aborted"}
+
+
+class StoredJobResult(BaseModel):
+    id: int
+    job_id: int
+    task_name: str
+    status: str
+    worker_id: int | None = None
+    worker_name: str | None = None
+    data: dict[str, Any]
+    created_at: datetime
+
+
+class JobResultListResponse(BaseModel):
+    items: list[StoredJobResult]
+    next_cursor: int | None = None
+
+
+class BatchJobItemResult(BaseModel):
+    index: int
+    name: str
+    success: bool
+    job_id: int | None = None
+    error: str | None = None
+
+
+class BatchJobResponse(BaseModel):
+    success: bool
+    deferred: int
+    failed: int
+    results: list[BatchJobItemResult]
+
+
+class JobEta(BaseModel):
+    job_id: int
+    queue: str
+    task_name: str
+    status: str
+    position: int  # 0 for the running job of the queue
+    units: int | None = None  # e.g. sales orders of the PO file, when known
+    predicted_seconds: float
+    estimated_start: datetime
+    estimated_finish: datetime
+
+
+class JobEtaListResponse(BaseModel):
+    items: list[JobEta]
+    computed_at: datetime | None = None
+
+
+class BulkJobFilter(BaseModel):
+    queue: str | None = None
+    task_name: str | None = None
+    submitter: str | None = None  # Owner of the API key that deferred the jobs
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+
+    def is_empty(self) -> bool:
+        return not self.model_dump(exclude_none=True)
+
+
+class BulkReprioritizeRequest(BulkJobFilter):
+    priority: int
+
+
+class BulkJobResponse(BaseModel):
+    affected: int
+    skipped: int  # Matching jobs that are already running
+    job_ids: list[int]
+
+
+def get_queue(req: JobRequest) -> str:
+    """Queue the job goes to: the requested one or the default queue of the task."""
+    task = app.tasks.get(req.name)
+    return req.queue or (task.queue if task else DEFAULT_QUEUE)
+
+
+def check_permission(req: JobRequest, key: ApiKey) -> None:
+    """
+    Checks that the API key may defer the task in the requested queue (or the task's default queue).
+
+    Raises:
+        PermissionError: If the key is not allowed to defer the job.
+    """
+    queue = get_queue(req)
+    if not key.can_defer(req.name, queue):
+        raise PermissionError(
+            f"API key of {key.owner} is not allowed to defer {req.name} in queue {queue}"
+        )
+
+
+def build_job(req: JobRequest, key: ApiKey) -> Job:
+    """
+    Build a procrastinate job for the request using the task registry of the API procrastinate app.
+
+    Raises:
+        ValueError: If the task is not declared in app.api.proc_app.
+        PermissionError: If the key is not allowed to defer the job.
+        ValidationError: If the kwargs do not match the task declaration.
+    """
+    if req.name not in app.tasks:
+        raise ValueError(f"Task {req.name} is not registered.")
+
+    check_permission(req, key)
+    task_kwargs_validator.validate(req.name, req.kwargs)
+
+    deferrer = app.configure_task(
+        name=req.name,
+        allow_unknown=False,
+        queue=req.queue,
+        priority=req.priority,
+        **req.job_options if req.job_options else {},
+    )
+    return deferrer.make_new_job(**req.kwargs if req.kwargs else {})
+
+
 @router.post(
     "/defer",
     status_code=status.HTTP_202_ACCEPTED,
     response_model=JobResponse,
     description="Defer a job to be executed",
 )
-async def defer_job(req: JobRequest, key: str = Depends(verify_api_key)):
+async def defer_job(
+    req: JobRequest,
+    response: Response,
+    idempotency_key: str | None = Header(
+        default=None, alias=config.api.idempotency_key_header, max_length=255
+    ),
+    key: ApiKey = Depends(verify_api_key),
+):
     print(req.model_dump())
-    with app.open():
-        job_id = app.configure_task(
+    try:
+        check_permission(req, key)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    try:
+        task_kwargs_validator.validate(req.name, req.kwargs)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=format_validation_error(req.name, e)
+        )
+
+    if idempotency_key is None:
+        return await admit_and_defer(req, key)
+
+    # A retried request with the same key returns the response of the first one without deferring again
+    client = str(key.id)
+    request_hash = hash_request(req.model_dump())
+    claimed = await idempotency_db.claim_key(
+        app.connector,
+        client=client,
+        key=idempotency_key,
+        request_hash=request_hash,
+        lease=config.api.idempotency_lease,
+    )
+    if not claimed:
+        existing = await idempotency_db.get_key(app.connector, client, idempotency_key)
+        if existing is None:
+            # Released by a failed submission in between, let the client retry
+            raise HTTPException(
+                status_code=409, detail="Idempotency key is being released, retry"
+            )
+        if existing["request_hash"] != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency key was already used with a different request",
+            )
+        if existing["job_id"] is None:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this idempotency key is still in progress",
+                headers={"Retry-After": str(config.api.idempotency_lease)},
+            )
+        response.headers["Idempotent-Replayed"] = "true"
+        return existing["response"]
+
+    try:
+        # Replays above are not counted by admission control
+        result = await admit_and_defer(req, key)
+    except Exception:
+        await release_idempotency_key(client, idempotency_key)
+        raise
+
+    try:
+        await idempotency_db.complete_key(
+            app.connector,
+            client=client,
+            key=idempotency_key,
+            job_id=result["job_id"],
+            response=result,
+            ttl=config.api.idempotency_ttl,
+        )
+    except Exception as e:
+        # The job is deferred: answer the request, a retry of the key will defer again
+        log.error(f"Failed to record idempotency key of job {result['job_id']}: {e}")
+        await release_idempotency_key(client, idempotency_key)
+    return result
+
+
+async def admit_and_defer(req: JobRequest, key: ApiKey) -> dict[str, Any]:
+    """Defers the job if admitted. The admission is given back if the job is not deferred."""
+    jobs_per_queue = {get_queue(req): 1}
+    admission.admit(key, jobs_per_queue)
+    try:
+        return await defer(req, key)
+    except Exception:
+        admission.release(key, jobs_per_queue)
+        raise
+
+
+async def release_idempotency_key(client: str, idempotency_key: str) -> None:
+    """Releases the claim of a request, or leaves it to expire with its lease if that fails."""
+    try:
+        await idempotency_db.release_key(app.connector, client, idempotency_key)
+    except Exception as e:
+        log.warning(
+            f"Failed to release idempotency key, it expires with its lease: {e}"
+        )
+
+
+async def defer(req: JobRequest, key: ApiKey) -> dict[str, Any]:
+    try:
+        deferrer = app.configure_task(
             name=req.name,
+            allow_unknown=False,
             queue=req.queue,
             priority=req.priority,
             **req.job_options if req.job_options else {},
-        ).defer(**req.kwargs)
+        )
+    except TaskNotFound:
+        raise HTTPException(
+            status_code=422, detail=f"Task {req.name} is not registered."
+        )
+
+    with DEFER_LATENCY.labels("single").time():
+        job_id = await deferrer.defer_async(**req.kwargs if req.kwargs else {})
+    await record_submitter([job_id], key)
 
     return {
         "success": True,
         "job_id": job_id,
         "message": f"Job {req.name} deferred successfully.",
     }
+
+
+async def record_submitter(job_ids: list[int], key: ApiKey) -> None:
+    """Records the owner of the key as the submitter of the jobs. The jobs are deferred even if it fails."""
+    if not job_ids:
+        return
+    try:
+        await submissions_db.record_submissions(
+            app.connector, job_ids, api_key_id=key.id, submitter=key.owner
+        )
+    except Exception as e:
+        log.warning(f"Failed to record the submitter of jobs {job_ids}: {e}")
+
+
+@router.post(
+    "/defer-batch",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=BatchJobResponse,
+    description="Defer multiple jobs to be executed in a single database round trip",
+)
+async def defer_jobs_batch(
+    reqs: list[JobRequest], key: ApiKey = Depends(verify_api_key)
+):
+    if not reqs:
+        raise HTTPException(status_code=400, detail="Batch contains no jobs")
+
+    if len(reqs) > config.api.max_batch_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size exceeds the limit of {config.api.max_batch_size} jobs",
+        )
+
+    results: list[BatchJobItemResult] = []
+    # Index of the result in `results` for every job that passed validation
+    pending: list[tuple[int, Job]] = []
+    for index, req in enumerate(reqs):
+        try:
+            job = build_job(req, key)
+        except Exception as e:
+            results.append(
+                BatchJobItemResult(
+                    index=index, name=req.name, success=False, error=str(e)
+                )
+            )
+            continue
+
+        results.append(BatchJobItemResult(index=index, name=req.name, success=True))
+        pending.append((index, job))
+
+    if pending:
+        jobs_per_queue: dict[str, int] = {}
+        for _, job in pending:
+            jobs_per_queue[job.queue] = jobs_per_queue.get(job.queue, 0) + 1
+        admission.admit(key, jobs_per_queue)
+
+        try:
+            # All jobs are inserted with one statement in one transaction
+            with DEFER_LATENCY.labels("batch").time():
+                deferred_jobs = await app.job_manager.batch_defer_jobs_async(
+                    [job for _, job in pending]
+                )
+            for (index, _), deferred_job in zip(pending, deferred_jobs):
+                results[index].job_id = deferred_job.id
+        except Exception as e:
+            # A single conflicting job (e.g. a queueing lock) aborts the whole statement.
+            # Fall back to deferring one by one so that only the bad entries fail.
+            log.warning(f"Batch defer failed, deferring jobs individually: {e}")
+            failed_per_queue: dict[str, int] = {}
+            for index, job in pending:
+                try:
+                    deferred_job = await app.job_manager.defer_job_async(job)
+                    results[index].job_id = deferred_job.id
+                except Exception as job_error:
+                    results[index].success = False
+                    results[index].error = str(job_error)
+                    failed_per_queue[job.queue] = failed_per_queue.get(job.queue, 0) + 1
+            admission.release(key, failed_per_queue)
+
+        await record_submitter(
+            [result.job_id for result in results if result.job_id is not None], key
+        )
+
+    failed = sum(1 for result in results if not result.success)
+    return {
+        "success": failed == 0,
+        "deferred": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
+
+
+@router.post(
+    "/cancel",
+    response_model=BulkJobResponse,
+    description="Cancel every waiting job matching the filter in one statement. Running jobs are skipped.",
+)
+async def cancel_jobs(job_filter: BulkJobFilter, key: ApiKey = Depends(verify_api_key)):
+    check_bulk_filter(job_filter)
+    result = await jobs_db.cancel_jobs(
+        app.connector,
+        **job_filter.model_dump(),
+        allowed_queues=key.allowed_queues,
+        allowed_tasks=key.allowed_tasks,
+    )
+    for queue, count in result["affected_per_queue"].items():
+        queue_stats.record_removed(queue, count)
+    log.info(
+        f"API key of {key.owner} cancelled {result['affected']} jobs ({result['skipped']} running jobs skipped) "
+        f"matching {job_filter.model_dump(exclude_none=True)}"
+    )
+    return result
+
+
+@router.post(
+    "/reprioritize",
+    response_model=BulkJobResponse,
+    description="Set the priority of every waiting job matching the filter in one statement. Running jobs are skipped.",
+)
+async def reprioritize_jobs(
+    req: BulkReprioritizeRequest, key: ApiKey = Depends(verify_api_key)
+):
+    job_filter = BulkJobFilter.model_validate(req.model_dump(exclude={"priority"}))
+    check_bulk_filter(job_filter)
+    result = await jobs_db.reprioritize_jobs(
+        app.connector,
+        req.priority,
+        **job_filter.model_dump(),
+        allowed_queues=key.allowed_queues,
+        allowed_tasks=key.allowed_tasks,
+    )
+    log.info(
+        f"API key of {key.owner} set the priority of {result['affected']} jobs to {req.priority} "
+        f"({result['skipped']} running jobs skipped) matching {job_filter.model_dump(exclude_none=True)}"
+    )
+    return result
+
+
+def check_bulk_filter(job_filter: BulkJobFilter) -> None:
+    """Refuses an empty filter, which would match every job."""
+    if job_filter.is_empty():
+        raise HTTPException(
+            status_code=400,
+            detail="At least one filter is required for bulk operations",
+        )
+
+
+@router.get(
+    "",
+    response_model=JobListResponse,
+    description="List jobs from the newest to the oldest. Pass next_cursor as cursor to fetch the next page.",
+)
+async def list_jobs(
+    queue: str | None = None,
+    task_name: str | None = None,
+    status: JobStatus | None = None,
+    submitter: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    cursor: int | None = Query(default=None, ge=1),
+    limit: int = Query(default=50, ge=1, le=500),
+    key: ApiKey = Depends(verify_api_key),
+):
+    # Fetch one extra row to know whether there is a next page
+    rows = await jobs_db.list_jobs(
+        app.connector,
+        queue=queue,
+        task_name=task_name,
+        submitter=submitter,
+        status=status,
+        created_after=created_after,
+        created_before=created_before,
+        allowed_queues=key.allowed_queues,
+        allowed_tasks=key.allowed_tasks,
+        cursor=cursor,
+        limit=limit + 1,
+    )
+    has_next = len(rows) > limit
+    items = rows[:limit]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_next else None,
+    }
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    description="Stream job status transitions as Server-Sent Events, optionally filtered by queue or job id",
+)
+async def stream_job_events(
+    request: Request,
+    queue: list[str] | None = Query(default=None),
+    job_id: list[int] | None = Query(default=None),
+    key: ApiKey = Depends(verify_api_key),
+):
+    try:
+        subscription = job_event_hub.subscribe(
+            queues=set(queue) if queue else None,
+            job_ids=set(job_id) if job_id else None,
+            key=key,
+        )
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for message in format_server_sent_events(request, subscription):
+                yield message
+        finally:
+            job_event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def format_server_sent_events(request: Request, subscription: Subscription):
+    heartbeat_interval = config.api.events_heartbeat_interval
+    while not await request.is_disconnected():
+        try:
+            event = await asyncio.wait_for(
+                subscription.events.get(), timeout=heartbeat_interval
+            )
+        except asyncio.TimeoutError:
+            # Comment line to keep the connection open through proxies
+            yield ": heartbeat\n\n"
+            continue
+        yield f"event: job_{event.get('event', 'status')}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get(
+    "/results",
+    response_model=JobResultListResponse,
+    description="List persisted job results by job id, task name or worker",
+)
+async def list_job_results(
+    job_id: int | None = None,
+    task_name: str | None = None,
+    worker_name: str | None = None,
+    worker_id: int | None = None,
+    cursor: int | None = Query(default=None, ge=1),
+    limit: int = Query(default=50, ge=1, le=500),
+    key: ApiKey = Depends(verify_api_key),
+):
+    rows = await results_db.list_results(
+        app.connector,
+        job_id=job_id,
+        task_name=task_name,
+        worker_name=worker_name,
+        worker_id=worker_id,
+        allowed_queues=key.allowed_queues,
+        allowed_tasks=key.allowed_tasks,
+        cursor=cursor,
+        limit=limit + 1,
+    )
+    has_next = len(rows) > limit
+    items = rows[:limit]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_next else None,
+    }
+
+
+@router.get(
+    "/eta",
+    response_model=JobEtaListResponse,
+    description="Estimated start and finish times of the waiting and running jobs, refreshed every few seconds",
+)
+async def list_job_etas(
+    queue: str | None = None, key: ApiKey = Depends(verify_api_key)
+):
+    return {
+        "items": [
+            eta
+            for eta in eta_estimator.list_estimates(queue)
+            if key.can_read(eta.task_name, eta.queue)
+        ],
+        "computed_at": eta_estimator.computed_at,
+    }
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobDetails,
+    description="Get the status, lifecycle events and result of a job",
+)
+async def get_job(job_id: int, key: ApiKey = Depends(verify_api_key)):
+    return await get_readable_job(job_id, key)
+
+
+async def get_readable_job(job_id: int, key: ApiKey) -> dict[str, Any]:
+    """
+    Gets a job the API key may read. Jobs of other queues or tasks are reported as not found,
+    so that their existence is not disclosed.
+    """
+    job = await jobs_db.get_job(app.connector, job_id)
+    if job is None or not key.can_read(job["task_name"], job["queue"]):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.get(
+    "/{job_id}/wait",
+    response_model=JobWaitResponse,
+    description="Wait until the job is finished and its result is available, or until the timeout expires",
+)
+async def wait_for_job(
+    job_id: int,
+    timeout: float = Query(
+        default=config.api.wait_default_timeout,
+        gt=0,
+        le=config.api.wait_max_timeout,
+    ),
+    key: ApiKey = Depends(verify_api_key),
+):
+    # Subscribe before reading the job so that no transition is missed in between.
+    # Waiting clients share the LISTEN connection of the hub and only borrow a pooled connection to re-read the job.
+    try:
+        subscription = job_event_hub.subscribe(job_ids={job_id})
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    try:
+        job = await get_readable_job(job_id, key)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not is_job_complete(job):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(subscription.events.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            job = await jobs_db.get_job(app.connector, job_id)
+    finally:
+        job_event_hub.unsubscribe(subscription)
+
+    complete = is_job_complete(job)
+    return {
+        "done": job["status"] in FINAL_STATUSES,
+        "timed_out": not complete,
+        "job": job,
+    }
+
+
+def is_job_complete(job: dict[str, Any]) -> bool:
+    """A job is complete when it is in a final status and, if it ran, its result has been written."""
+    if job["status"] not in FINAL_STATUSES:
+        return False
+    if job["status"] in ("succeeded", "failed"):
+        return job["result"] is not None
+    return True
+
+
+async def get_job_artifacts(job_id: int, key: ApiKey) -> dict[str, Path]:
+    """Output files of the job that exist on the share, by file name."""
+    if not config.api.share_path:
+        raise HTTPException(status_code=503, detail="API_SHARE_PATH is not configured")
+
+    job = await get_readable_job(job_id, key)
+    if job["result"] is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no result yet")
+
+    artifacts = collect_artifacts(
+        job["result"]["data"] or {},
+        drive_letter=config.worker.network_drive_letter,
+        share_path=config.api.share_path,
+    )
+    # Network share I/O must not block the event loop
+    exists = await asyncio.to_thread(
+        lambda: {name: path.is_file() for name, path in artifacts.items()}
+    )
+    return {name: path for name, path in artifacts.items() if exists[name]}
+
+
+@router.get(
+    "/{job_id}/eta",
+    response_model=JobEta,
+    description="Estimated start and finish time of a waiting or running job",
+)
+async def get_job_eta(job_id: int, key: ApiKey = Depends(verify_api_key)):
+    eta = eta_estimator.get(job_id)
+    if eta is not None:
+        if not key.can_read(eta.task_name, eta.queue):
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return eta
+
+    # Deferred after the last computation, or already finished
+    job = await get_readable_job(job_id, key)
+    if job["status"] != "todo":
+        raise HTTPException(
+            status_code=409, detail=f"Job {job_id} is {job['status']}, not waiting"
+        )
+    return eta_estimator.estimate_appended(job)
+
+
+@router.get(
+    "/{job_id}/artifacts",
+    response_model=JobArtifactsResponse,
+    description="List the output files of a job",
+)
+async def list_job_artifacts(job_id: int, key: ApiKey = Depends(verify_api_key)):
+    artifacts = await get_job_artifacts(job_id, key)
+
+    def describe(name: str, path: Path) -> dict[str, Any]:
+        return {"name": name, "size": path.stat().st_size, "etag": make_etag(path)}
+
+    return {
+        "job_id": job_id,
+        "artifacts": await asyncio.to_thread(
+            lambda: [describe(name, path) for name, path in artifacts.items()]
+        ),
+    }
+
+
+@router.get(
+    "/{job_id}/artifacts.zip",
+    response_class=StreamingResponse,
+    description="Download all the output files of a job as a zip archive streamed on the fly",
+)
+async def download_job_artifacts_zip(
+    job_id: int, key: ApiKey = Depends(verify_api_key)
+):
+    artifacts = await get_job_artifacts(job_id, key)
+    if not artifacts:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no artifacts")
+
+    # Sync iterators are consumed in the threadpool by Starlette
+    return StreamingResponse(
+        iter_zip(artifacts, chunk_size=config.api.upload_chunk_size),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="job_{job_id}_artifacts.zip"'
+        },
+    )
+
+
+@router.get(
+    "/{job_id}/artifacts/{name}",
+    response_class=FileResponse,
+    description="Download an output file of a job. Supports Range requests and conditional GETs (ETag).",
+)
+async def download_job_artifact(
+    job_id: int, name: str, request: Request, key: ApiKey = Depends(verify_api_key)
+):
+    artifacts = await get_job_artifacts(job_id, key)
+    path = artifacts.get(name)
+    if path is None:
+        raise HTTPException(
+            status_code=404, detail=f"Artifact {name} not found for job {job_id}"
+        )
+
+    etag = await asyncio.to_thread(make_etag, path)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse streams the file and answers Range / If-Range requests
+    return FileResponse(path, filename=name, headers=headers)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from fastapi import APIRouter, status, Depends, HTTPException, UploadFile, File, Form
+from pydantic import BaseModel, ValidationError
+from app.api.admission import admission
+from app.api.auth import verify_api_key
+from pathlib import Path
+from app.api.proc_app import app
+from app.api.staging import (
+    stage_file,
+    count_sales_orders,
+    remove_staged_file,
+    StagedFile,
+    UploadTooLargeError,
+)
+from app.api.validation import task_kwargs_validator, format_validation_error
+from app.config import config
+from app.db import timings as timings_db
+from app.logging import log
+from app.models import ApiKey
+from .jobs import JobRequest, check_permission, defer, get_queue
+
+router = APIRouter()
+
+ALLOWED_EXTENSIONS = {".xlsx", ".xlsm", ".xls"}
+
+
+class UploadJobResponse(BaseModel):
+    success: bool
+    message: str
+    job_id: int
+    po_working_path: str
+    size: int
+    sha256: str
+
+
+@router.post(
+    "/upload",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=UploadJobResponse,
+    description="Upload a PO workbook to the network share and defer create_sales_orders for it",
+)
+async def upload_and_create_sales_orders(
+    file: UploadFile = File(...),
+    va01_details: str = Form(..., description="JSON object"),
+    screen_order: str = Form(..., description="JSON array"),
+    priority: int | None = Form(default=None),
+    chunk_size: int | None = Form(
+        default=None,
+        gt=0,
+        description="Split files with more sales orders into chunk jobs of this size",
+    ),
+    key: ApiKey = Depends(verify_api_key),
+):
+    if not config.api.share_path:
+        raise HTTPException(status_code=503, detail="API_SHARE_PATH is not configured")
+
+    filename = file.filename or ""
+    if not any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unsupported file type, expected one of {sorted(ALLOWED_EXTENSIONS)}",
+        )
+
+    try:
+        kwargs = {
+            "va01_details": json.loads(va01_details),
+            "screen_order": json.loads(screen_order),
+        }
+        if chunk_size is not None:
+            kwargs["chunk_size"] = chunk_size
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON form field: {e}")
+
+    # Reject bad submissions before copying anything to the share.
+    # po_working_path is validated with a placeholder since it is only known after staging.
+    req = JobRequest(name="create_sales_orders", kwargs=kwargs, priority=priority)
+    try:
+        check_permission(req, key)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    try:
+        task_kwargs_validator.validate(req.name, {**kwargs, "po_working_path": ""})
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=format_validation_error(req.name, e)
+        )
+    jobs_per_queue = {get_queue(req): 1}
+    admission.admit(key, jobs_per_queue)
+
+    try:
+        staged = await asyncio.to_thread(
+            stage_file,
+            file.file,
+            filename,
+            share_path=config.api.share_path,
+            upload_dir=config.api.upload_dir,
+            max_size=config.api.upload_max_size,
+            chunk_size=config.api.upload_chunk_size,
+        )
+    except UploadTooLargeError as e:
+        admission.release(key, jobs_per_queue)
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception:
+        admission.release(key, jobs_per_queue)
+        raise
+    finally:
+        await file.close()
+
+    log.info(
+        f"Staged {filename} at {staged.relative_path} ({staged.size} bytes, sha256 {staged.sha256})"
+    )
+
+    req.kwargs["po_working_path"] = staged.relative_path
+    try:
+        result = await defer(req, key)
+    except Exception:
+        admission.release(key, jobs_per_queue)
+        await asyncio.to_thread(remove_staged_file, config.api.share_path, staged)
+        raise
+    await record_sales_orders_count(result["job_id"], staged)
+    return {
+        **result,
+        "po_working_path": staged.relative_path,
+        "size": staged.size,
+        "sha256": staged.sha256,
+    }
+
+
+async def record_sales_orders_count(job_id: int, staged: StagedFile) -> None:
+    """Records the number of sales orders of the workbook as the cost of the job, to estimate its run time."""
+    try:
+        count = await asyncio.to_thread(
+            count_sales_orders, Path(config.api.share_path) / staged.relative_path
+        )
+        await timings_db.record_job_cost(app.connector, job_id, count)
+    except Exception as e:
+        log.warning(f"Failed to count the sales orders of job {job_id}: {e}")
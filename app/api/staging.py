@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO
+from fastapi import HTTPException
+from rpatoolkit.df import read_excel
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an uploaded file exceeds the maximum upload size."""
+
+
+@dataclass
+class StagedFile:
+    relative_path: str  # Relative to the share root, as expected by the worker tasks
+    size: int
+    sha256: str
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects upload requests with a body larger than `max_body_size` bytes with 413 as it is received,
+    before Starlette spools the uploaded file to disk: right away from the Content-Length header, or as
+    soon as a body without it goes over the limit.
+    """
+
+    def __init__(self, app: ASGIApp, paths: set[str], max_body_size: int):
+        self.app = app
+        self.paths = paths
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            # Raised while the body is parsed, so the exception handlers of the app answer it
+            if content_length.isdigit() and int(content_length) > self.max_body_size:
+                raise self._too_large()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=413,
+            detail=f"Request exceeds the maximum upload size of {self.max_body_size} bytes",
+        )
+
+
+def safe_upload_name(filename: str) -> str:
+    """Keeps only the base name of the uploaded file, without characters that are forbidden on Windows shares."""
+    name = Path(filename.replace("\\", "/")).name
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .")
+    return name or "upload.xlsx"
+
+
+def stage_file(
+    source: BinaryIO,
+    filename: str,
+    share_path: str | Path,
+    upload_dir: str,
+    max_size: int,
+    chunk_size: int = 1024 * 1024,
+) -> StagedFile:
+    """
+    Copies the uploaded file to a new directory on the share, chunk by chunk, computing its SHA-256 on the way.
+
+    The file is written under a temporary name and renamed into place once complete, so a worker never sees
+    a partially written workbook. This is blocking I/O, run it in a thread.
+
+    Raises:
+        UploadTooLargeError: If the file is larger than `max_size` bytes.
+    """
+    relative_dir = (
+        Path(upload_dir)
+        / datetime.now(timezone.utc).strftime("%Y%m%d")
+        / uuid.uuid4().hex
+    )
+    target_dir = Path(share_path) / relative_dir
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    name = safe_upload_name(filename)
+    target_path = target_dir / name
+    temp_path = target_dir / f".{name}.part"
+
+    checksum = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as target:
+            while chunk := source.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"File exceeds the maximum upload size of {max_size} bytes"
+                    )
+                checksum.update(chunk)
+                target.write(chunk)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_path, target_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        try:
+            target_dir.rmdir()
+        except OSError:
+            pass
+        raise
+
+    return StagedFile(
+        relative_path=(relative_dir / name).as_posix(),
+        size=size,
+        sha256=checksum.hexdigest(),
+    )
+
+
+def remove_staged_file(share_path: str | Path, staged: StagedFile) -> None:
+    """Deletes a staged file and its directory, e.g. when its job could not be deferred."""
+    path = Path(share_path) / staged.relative_path
+    path.unlink(missing_ok=True)
+    try:
+        path.parent.rmdir()
+    except OSError:
+        pass
+
+
+def count_sales_orders(path: str | Path) -> int:
+    """
+    Counts the sales orders of a PO workbook: groups of consecutive rows with a PO number,
+    separated by empty rows, as create_sales_orders reads them. This is blocking I/O, run it in a thread.
+    """
+    df = read_excel(path, drop_empty_cols=False, drop_empty_rows=False).collect()
+    if "po number" not in df.columns:
+        return 0
+    has_po = df["po number"].is_not_null()
+    return int((has_po & ~has_po.shift(1, fill_value=False)).sum())
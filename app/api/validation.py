@@ -0,0 +1,80 @@
+import inspect
+from typing import Any, get_type_hints
+from pydantic import BaseModel, ConfigDict, ValidationError, create_model
+from procrastinate import App
+from procrastinate.tasks import Task
+from app.logging import log
+
+
+def build_kwargs_model(task: Task) -> type[BaseModel]:
+    """
+    Builds a pydantic model of the keyword arguments of a task from the type hints of its declaration.
+    The JobContext parameter of tasks declared with pass_context is skipped.
+    """
+    signature = inspect.signature(task.func)
+    type_hints = get_type_hints(task.func, include_extras=True)
+    parameters = list(signature.parameters.values())
+    if task.pass_context:
+        parameters = parameters[1:]
+
+    extra = "forbid"
+    fields: dict[str, Any] = {}
+    for parameter in parameters:
+        if parameter.kind == inspect.Parameter.VAR_KEYWORD:
+            extra = "allow"
+            continue
+        if parameter.kind == inspect.Parameter.VAR_POSITIONAL:
+            continue
+        annotation = type_hints.get(parameter.name, Any)
+        default = (
+            ... if parameter.default is inspect.Parameter.empty else parameter.default
+        )
+        fields[parameter.name] = (annotation, default)
+
+    return create_model(
+        f"{task.name}_kwargs",
+        __config__=ConfigDict(extra=extra, arbitrary_types_allowed=True),
+        **fields,
+    )
+
+
+class TaskKwargsValidator:
+    """Validates job kwargs against models compiled once from the task declarations."""
+
+    def __init__(self):
+        self._models: dict[str, type[BaseModel]] = {}
+
+    def compile(self, app: App) -> None:
+        for name, task in app.tasks.items():
+            try:
+                self._models[name] = build_kwargs_model(task)
+            except Exception as e:
+                log.warning(f"Failed to build kwargs validator for task {name}: {e}")
+        log.info(f"Compiled kwargs validators for {len(self._models)} tasks")
+
+    def validate(self, task_name: str, kwargs: dict[str, Any] | None) -> None:
+        """
+        Raises:
+            ValidationError: If the kwargs do not match the task declaration.
+        """
+        model = self._models.get(task_name)
+        if model is None:
+            return
+        model.model_validate(kwargs or {})
+
+
+def format_validation_error(
+    task_name: str, error: ValidationError
+) -> list[dict[str, Any]]:
+    return [
+        {
+            "loc": ["kwargs", *err["loc"]],
+            "msg": err["msg"],
+            "type": err["type"],
+            "task": task_name,
+        }
+        for err in error.errors(include_url=False, include_context=False)
+    ]
+
+
+task_kwargs_validator = TaskKwargsValidator()
@@ -13,8 +13,62 @@ class APISettings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     key_header: str = "X-API-KEY"
+    key_cache_size: int = 1024
+    key_cache_ttl: float = 60.0  # Seconds, upper bound for a revocation to take effect
+    key_cache_negative_ttl: float = 5.0  # Seconds an unknown key is remembered
     prefix: str = "/api"
 
     title: str = "Desktop Worker Agent API"
     version: str = "0.1.0"
     description: str = "A desktop worker agent to execute tasks that require a GUI"
+    max_batch_size: int = 500
+
+    # Job events stream (Server-Sent Events)
+    events_max_subscribers: int = 1000
+    events_subscriber_queue_size: int = 100
+    events_heartbeat_interval: float = 15.0  # Seconds
+    events_listener_retry_max_delay: float = (
+        30.0  # Seconds between restarts of the listener
+    )
+
+    # Long-poll wait for a job to finish
+    wait_default_timeout: float = 30.0  # Seconds
+    wait_max_timeout: float = 300.0  # Seconds
+
+    # Idempotent job submission
+    idempotency_key_header: str = "Idempotency-Key"
+    idempotency_ttl: int = 86400  # Seconds a key maps to its job
+    idempotency_lease: int = 60  # Seconds a request in progress holds its key
+    idempotency_purge_interval: float = 3600.0  # Seconds
+
+    # Admission control
+    rate_limit_per_minute: float = 60.0  # Jobs per API key
+    rate_limit_burst: int = 20  # Larger batches are admitted with a full bucket
+    max_queue_backlog: dict[str, int] = {}  # e.g. {"sap": 200}
+    default_max_queue_backlog: int | None = None  # For queues not in max_queue_backlog
+    queue_stats_refresh_interval: float = 5.0  # Seconds
+    queue_stats_throughput_window: float = 900.0  # Seconds
+
+    # Network share where PO workbooks are staged, as mounted on the API host.
+    # It must be the same share as the worker's WORKER_NETWORK_DRIVE_LETTER.
+    share_path: str | None = None
+    upload_dir: str = "uploads"  # Relative to share_path
+    upload_max_size: int = 100 * 1024 * 1024  # Bytes
+    upload_form_max_size: int = (
+        1024 * 1024
+    )  # Bytes of the other form fields of an upload
+    upload_chunk_size: int = 1024 * 1024  # Bytes
+
+    # Estimated start and finish times of waiting jobs
+    eta_refresh_interval: float = 10.0  # Seconds
+    eta_default_job_seconds: float = (
+        300.0  # Predicted run time of tasks without timings yet
+    )
+
+    # Health and readiness probes
+    health_cache_ttl: float = 5.0  # Seconds a readiness result is served from memory
+    health_db_timeout: float = 2.0  # Seconds
+    worker_heartbeat_timeout: float = 60.0  # Seconds after which a worker is not live
+    ready_queues: list[str] | None = (
+        None  # Queues that need a live worker, defaults to the declared tasks' queues
+    )
@@ -17,6 +17,13 @@ class DBSettings(BaseSettings):
     name: str = "postgres"
     url: str | None = None
 
+    # Connection pool used by the API service
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    pool_timeout: float = 10.0  # Seconds to wait for a free connection
+    pool_max_idle: float = 300.0  # Seconds before an idle connection is closed
+    pool_max_lifetime: float = 3600.0  # Seconds before a connection is recycled
+
     def model_post_init(self, context):
         # Check if DB_URL was provided in env
         if self.url:
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from app.logging import log
 from .utils import get_env_file, get_keyring_password
@@ -18,6 +19,9 @@ class SAPSettings(BaseSettings):
     executable_path: str | None = (
         r"C:\Program Files (x86)\SAP\FrontEnd\SAPgui\saplogon.exe"
     )
+    # host: SAP jobs run one at a time per desktop, in parallel across desktops.
+    # global: one SAP job at a time in the whole fleet.
+    lock_scope: Literal["host", "global"] = "host"
 
     def model_post_init(self, context):
         if self.username is None:
@@ -34,6 +38,11 @@ class SAPSettings(BaseSettings):
 
         return super().model_post_init(context)
 
+    @property
+    def job_lock(self) -> str | None:
+        """Procrastinate lock of SAP jobs. With the host scope, the worker holds a host lock instead."""
+        return "sap" if self.lock_scope == "global" else None
+
     def validate_config(self) -> bool:
         errors = []
         if not self.username:
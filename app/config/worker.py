@@ -14,10 +14,60 @@ class WorkerSettings(BaseSettings):
     concurrency: int = 1
     name: str | None = None
     queues: list[str] | None = None
+    # Jobs run at the same time per queue, e.g. {"sap": 1, "default": 4}. When set, each queue runs in its own
+    # sub-worker with its own connection pool, and concurrency and queues are ignored.
+    queue_concurrency: dict[str, int] = {}
+    queue_pool_size: dict[
+        str, int
+    ] = {}  # Max connections per sub-worker, defaults to concurrency + 2
     import_paths: list[str] = ["app.worker.tasks"]
     api_key: str | None = None
     network_drive_letter: str | None = "Z:"  # With colon
 
+    # Background publisher of job results
+    result_sinks: list[str] = ["postgres"]  # postgres, webhook and/or windmill
+    result_spool_dir: str = (
+        "spool/results"  # Results not yet published, one directory per sink
+    )
+    result_queue_size: int = 1000
+    result_batch_size: int = 100
+    result_flush_interval: float = 1.0  # Seconds
+    result_retry_max_delay: float = (
+        300.0  # Seconds between retries of an unavailable sink
+    )
+    result_webhook_url: str | None = None
+    result_webhook_headers: dict[str, str] = {}
+    result_webhook_timeout: float = 10.0  # Seconds
+    result_windmill_run_path: str | None = (
+        None  # e.g. w/<workspace>/jobs/run/p/<script path>
+    )
+    timing_smoothing: float = 0.2  # Weight of a new sample in the task timings averages
+    # Seconds during which the sales orders created from a PO file are not created again for the same file
+    sales_order_ledger_ttl: float = 604800.0
+
+    # Queues whose jobs drive the SAP GUI. Workers listening to one of them log on to SAP at start
+    # and keep the session across jobs, and their jobs count as SAP actions in the metrics.
+    # "<queue>:<connection name>" queues hold jobs for the workers holding that SAP connection:
+    # a desktop connected to "340 Quality" listens to both "sap" and "sap:340 Quality".
+    sap_queues: list[str] = ["sap"]
+
+    # Small sales order jobs deferred within this many seconds of each other, with the same VA01 details
+    # and screen order, run back-to-back in the job of the first one. 0 disables batching,
+    # which is required with SAP_LOCK_SCOPE=global.
+    sap_batch_window: float = 30.0
+    sap_batch_max_jobs: int = 10  # Jobs run by one job besides its own file
+    sap_batch_max_units: int = 3  # Largest number of sales orders of a batched file
+
+    # Seconds after which a job started while another job held its host lock, e.g. the SAP GUI, is retried
+    host_lock_retry_delay: int = 5
+
+    # Heartbeat read by the API readiness check
+    heartbeat_interval: float = 10.0  # Seconds
+
+    # Local Prometheus endpoint of the worker process, disabled when the port is empty
+    metrics_port: int | None = 9101
+    metrics_host: str = "127.0.0.1"
+
     def validate_config(self) -> bool:
         if not self.api_key:
             log.error("WORKER_API_KEY is not set in environment variables or keyring.")
@@ -29,8 +79,39 @@ class WorkerSettings(BaseSettings):
             )
             return False
 
+        unknown_sinks = set(self.result_sinks) - {"postgres", "webhook", "windmill"}
+        if unknown_sinks:
+            log.error(f"Unknown result sinks in WORKER_RESULT_SINKS: {unknown_sinks}")
+            return False
+
+        if "webhook" in self.result_sinks and not self.result_webhook_url:
+            log.error(
+                "WORKER_RESULT_WEBHOOK_URL is required by the webhook result sink."
+            )
+            return False
+
+        if "windmill" in self.result_sinks and not self.result_windmill_run_path:
+            log.error(
+                "WORKER_RESULT_WINDMILL_RUN_PATH is required by the windmill result sink."
+            )
+            return False
+
         return True
 
+    def is_sap_queue(self, queue: str) -> bool:
+        """SAP queues, and their per connection variants, e.g. "sap:340 Quality" for jobs targeting that connection."""
+        return queue.split(":", 1)[0] in self.sap_queues
+
+    def serves_sap(self) -> bool:
+        queues = self.get_queues()
+        return queues is None or any(self.is_sap_queue(queue) for queue in queues)
+
+    def get_queues(self) -> list[str] | None:
+        """Queues listened to by this worker process, None means all queues."""
+        if self.queue_concurrency:
+            return list(self.queue_concurrency)
+        return self.queues
+
     def model_post_init(self, context):
         if self.api_key is None:
             log.warning(
@@ -0,0 +1,3 @@
+from .schema import apply_schema, apply_schema_async
+
+__all__ = ["apply_schema", "apply_schema_async"]
@@ -0,0 +1,38 @@
+"""Queries over the API keys table."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+GET_ACTIVE_KEY_QUERY: LiteralString = """
+SELECT id, owner, allowed_queues, allowed_tasks
+FROM desktop_agent_api_keys
+WHERE key_hash = %(key_hash)s AND revoked_at IS NULL
+"""
+
+CREATE_KEY_QUERY: LiteralString = """
+INSERT INTO desktop_agent_api_keys (key_hash, owner, allowed_queues, allowed_tasks)
+VALUES (%(key_hash)s, %(owner)s, %(allowed_queues)s, %(allowed_tasks)s)
+RETURNING id
+"""
+
+REVOKE_KEY_QUERY: LiteralString = """
+UPDATE desktop_agent_api_keys
+SET revoked_at = NOW()
+WHERE id = %(id)s AND revoked_at IS NULL
+RETURNING id
+"""
+
+LIST_KEYS_QUERY: LiteralString = """
+SELECT id, owner, allowed_queues, allowed_tasks, created_at, revoked_at
+FROM desktop_agent_api_keys
+ORDER BY id
+"""
+
+
+async def get_active_key(
+    connector: BaseConnector, key_hash: str
+) -> dict[str, Any] | None:
+    rows = await connector.execute_query_all_async(
+        GET_ACTIVE_KEY_QUERY, key_hash=key_hash
+    )
+    return rows[0] if rows else None
@@ -0,0 +1,98 @@
+"""Queries over the idempotency keys table."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+# Claims the key for `lease` seconds, or takes over an expired key or claim. Returns no row if the key
+# is already taken.
+CLAIM_KEY_QUERY: LiteralString = """
+INSERT INTO desktop_agent_idempotency_keys (client, key, request_hash, expires_at)
+VALUES (%(client)s, %(key)s, %(request_hash)s, NOW() + make_interval(secs => %(lease)s))
+ON CONFLICT (client, key) DO UPDATE
+    SET request_hash = EXCLUDED.request_hash,
+        job_id = NULL,
+        response = NULL,
+        created_at = NOW(),
+        expires_at = EXCLUDED.expires_at
+    WHERE desktop_agent_idempotency_keys.expires_at < NOW()
+RETURNING key
+"""
+
+GET_KEY_QUERY: LiteralString = """
+SELECT request_hash, job_id, response
+FROM desktop_agent_idempotency_keys
+WHERE client = %(client)s AND key = %(key)s
+"""
+
+COMPLETE_KEY_QUERY: LiteralString = """
+UPDATE desktop_agent_idempotency_keys
+SET job_id = %(job_id)s,
+    response = %(response)s,
+    expires_at = NOW() + make_interval(secs => %(ttl)s)
+WHERE client = %(client)s AND key = %(key)s
+"""
+
+RELEASE_KEY_QUERY: LiteralString = """
+DELETE FROM desktop_agent_idempotency_keys
+WHERE client = %(client)s AND key = %(key)s AND job_id IS NULL
+"""
+
+PURGE_EXPIRED_KEYS_QUERY: LiteralString = """
+WITH deleted AS (
+    DELETE FROM desktop_agent_idempotency_keys WHERE expires_at < NOW() RETURNING 1
+)
+SELECT count(*) AS count FROM deleted
+"""
+
+
+async def claim_key(
+    connector: BaseConnector, client: str, key: str, request_hash: str, lease: int
+) -> bool:
+    """
+    Returns True if the key was claimed for this request, False if it is already used.
+
+    The claim expires after `lease` seconds unless completed, so a request that died before completing
+    it does not block the retries of the key.
+    """
+    rows = await connector.execute_query_all_async(
+        CLAIM_KEY_QUERY, client=client, key=key, request_hash=request_hash, lease=lease
+    )
+    return len(rows) > 0
+
+
+async def get_key(
+    connector: BaseConnector, client: str, key: str
+) -> dict[str, Any] | None:
+    rows = await connector.execute_query_all_async(
+        GET_KEY_QUERY, client=client, key=key
+    )
+    return rows[0] if rows else None
+
+
+async def complete_key(
+    connector: BaseConnector,
+    client: str,
+    key: str,
+    job_id: int,
+    response: dict[str, Any],
+    ttl: int,
+) -> None:
+    """Maps the key to the deferred job for `ttl` seconds."""
+    await connector.execute_query_async(
+        COMPLETE_KEY_QUERY,
+        client=client,
+        key=key,
+        job_id=job_id,
+        response=response,
+        ttl=ttl,
+    )
+
+
+async def release_key(connector: BaseConnector, client: str, key: str) -> None:
+    """Releases a claimed key when the submission failed, so that it can be retried."""
+    await connector.execute_query_async(RELEASE_KEY_QUERY, client=client, key=key)
+
+
+async def purge_expired_keys(connector: BaseConnector) -> int:
+    row = await connector.execute_query_one_async(PURGE_EXPIRED_KEYS_QUERY)
+    return row["count"]
@@ -0,0 +1,410 @@
+"""Queries over the procrastinate jobs and events tables."""
+
+from datetime import datetime
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+from procrastinate.exceptions import NoResult
+from psycopg.types.json import Jsonb
+
+JOB_COLUMNS: LiteralString = """
+    j.id,
+    j.queue_name AS queue,
+    j.task_name,
+    j.status,
+    j.priority,
+    j.lock,
+    j.queueing_lock,
+    j.args AS kwargs,
+    j.attempts,
+    j.scheduled_at,
+    j.worker_id,
+    (SELECT s.submitter FROM desktop_agent_job_submissions s WHERE s.job_id = j.id) AS submitter,
+    ev.created_at,
+    ev.started_at,
+    ev.finished_at,
+    (
+        SELECT json_build_object(
+            'id', r.job_id,
+            'worker_id', r.worker_id,
+            'worker_name', r.worker_name,
+            'task_name', r.task_name,
+            'status', r.status,
+            'data', r.data
+        )
+        FROM desktop_agent_job_results r
+        WHERE r.job_id = j.id
+        ORDER BY r.id DESC
+        LIMIT 1
+    ) AS result
+"""
+
+# Timestamps of the job lifecycle, looked up by the job_id index of the events table
+JOB_EVENTS_LATERAL: LiteralString = """
+    LEFT JOIN LATERAL (
+        SELECT
+            min(e.at) FILTER (WHERE e.type = 'deferred') AS created_at,
+            max(e.at) FILTER (WHERE e.type = 'started') AS started_at,
+            max(e.at) FILTER (
+                WHERE e.type IN ('succeeded', 'failed', 'cancelled', 'aborted')
+            ) AS finished_at
+        FROM procrastinate_events e
+        WHERE e.job_id = j.id
+    ) ev ON TRUE
+"""
+
+GET_JOB_QUERY: LiteralString = (
+    "SELECT"
+    + JOB_COLUMNS
+    + """,
+    COALESCE(
+        (
+            SELECT json_agg(json_build_object('type', e.type, 'at', e.at) ORDER BY e.id)
+            FROM procrastinate_events e
+            WHERE e.job_id = j.id
+        ),
+        '[]'::json
+    ) AS events
+FROM procrastinate_jobs j
+"""
+    + JOB_EVENTS_LATERAL
+    + """
+WHERE j.id = %(job_id)s
+"""
+)
+
+LIST_JOBS_QUERY: LiteralString = (
+    "SELECT"
+    + JOB_COLUMNS
+    + """
+FROM procrastinate_jobs j
+"""
+    + JOB_EVENTS_LATERAL
+    + """
+WHERE {filters}
+ORDER BY j.id DESC
+LIMIT %(limit)s
+"""
+)
+
+# Updates every waiting job matching the filters in one statement. Running jobs are counted but left
+# untouched, and the status is checked again on the locked row so a job fetched by a worker in the
+# meantime is skipped too.
+BULK_UPDATE_QUERY: LiteralString = """
+WITH matched AS (
+    SELECT j.id
+    FROM procrastinate_jobs j
+    WHERE j.status IN ('todo', 'doing') AND {filters}
+),
+updated AS (
+    UPDATE procrastinate_jobs j
+    SET {assignments}
+    FROM matched m
+    WHERE j.id = m.id AND j.status = 'todo'
+    RETURNING j.id, j.queue_name
+)
+SELECT
+    (SELECT count(*) FROM updated) AS affected,
+    (SELECT count(*) FROM matched) - (SELECT count(*) FROM updated) AS skipped,
+    COALESCE((SELECT array_agg(id ORDER BY id) FROM updated), '{}'::bigint[]) AS job_ids,
+    COALESCE(
+        (
+            SELECT json_object_agg(queue_name, count)
+            FROM (SELECT queue_name, count(*) AS count FROM updated GROUP BY queue_name) q
+        ),
+        '{}'::json
+    ) AS affected_per_queue
+"""
+
+# When the job became runnable: the later of its schedule and its last deferral, retries included
+JOB_QUEUED_AT_QUERY: LiteralString = """
+SELECT GREATEST(
+    j.scheduled_at,
+    (
+        SELECT max(e.at) FROM procrastinate_events e
+        WHERE e.job_id = j.id AND e.type IN ('deferred', 'deferred_for_retry')
+    )
+) AS queued_at
+FROM procrastinate_jobs j
+WHERE j.id = %(job_id)s
+"""
+
+# Claims waiting jobs of the task in the queue of a running job for its worker, as procrastinate would fetch
+# them: jobs deferred within `window` seconds of it, with a known cost of at most `max_units` and kwargs
+# matching {match}. Claimed jobs get the worker_id of the running job.
+CLAIM_BATCH_QUERY: LiteralString = """
+WITH leader AS (
+    SELECT min(e.at) AS deferred_at
+    FROM procrastinate_events e
+    WHERE e.job_id = %(job_id)s AND e.type = 'deferred'
+),
+candidates AS (
+    SELECT j.id
+    FROM procrastinate_jobs j
+    JOIN desktop_agent_job_costs c ON c.job_id = j.id
+    CROSS JOIN leader
+    WHERE j.status = 'todo'
+        AND j.queue_name = %(queue)s
+        AND j.task_name = %(task_name)s
+        AND (j.scheduled_at IS NULL OR j.scheduled_at <= NOW())
+        -- Same lock rules as procrastinate_fetch_job_v2: no job with the same lock is running, e.g. the
+        -- running job itself, or waiting ahead of this one, so at most one job per lock is claimed
+        AND NOT EXISTS (
+            SELECT 1 FROM procrastinate_jobs other
+            WHERE j.lock IS NOT NULL
+                AND other.lock = j.lock
+                AND (
+                    other.status = 'doing'
+                    OR (
+                        other.status = 'todo'
+                        AND (
+                            other.priority > j.priority
+                            OR (other.priority = j.priority AND other.id < j.id)
+                        )
+                    )
+                )
+        )
+        AND c.units <= %(max_units)s
+        AND {match}
+        AND EXISTS (
+            SELECT 1 FROM procrastinate_events e
+            WHERE e.job_id = j.id
+                AND e.type = 'deferred'
+                AND e.at BETWEEN leader.deferred_at - make_interval(secs => %(window)s)
+                    AND leader.deferred_at + make_interval(secs => %(window)s)
+        )
+    ORDER BY j.priority DESC, j.id
+    LIMIT %(limit)s
+    FOR UPDATE OF j SKIP LOCKED
+)
+UPDATE procrastinate_jobs j
+SET status = 'doing', worker_id = %(worker_id)s
+FROM candidates
+WHERE j.id = candidates.id
+RETURNING j.*
+"""
+
+# Puts claimed jobs that were not run back in their queue, as if they had never been fetched
+RELEASE_JOBS_QUERY: LiteralString = """
+UPDATE procrastinate_jobs
+SET status = 'todo', worker_id = NULL
+WHERE id = ANY(%(job_ids)s::bigint[]) AND status = 'doing'
+"""
+
+
+async def get_job(connector: BaseConnector, job_id: int) -> dict[str, Any] | None:
+    """Gets a job with its lifecycle events. Returns None if the job does not exist."""
+    try:
+        return await connector.execute_query_one_async(GET_JOB_QUERY, job_id=job_id)
+    except NoResult:
+        return None
+
+
+async def get_job_queued_at(connector: BaseConnector, job_id: int) -> datetime | None:
+    row = await connector.execute_query_one_async(JOB_QUEUED_AT_QUERY, job_id=job_id)
+    return row["queued_at"]
+
+
+async def list_jobs(
+    connector: BaseConnector,
+    *,
+    queue: str | None = None,
+    task_name: str | None = None,
+    submitter: str | None = None,
+    status: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    allowed_queues: list[str] | None = None,
+    allowed_tasks: list[str] | None = None,
+    cursor: int | None = None,
+    limit: int = 50,
+) -> list[dict[str, Any]]:
+    """
+    Lists jobs from the newest to the oldest using keyset pagination.
+
+    Only the provided filters are added to the query so that the planner can pick the matching
+    (column, id) index and stop after `limit` rows, instead of scanning every finished job.
+
+    Args:
+        allowed_queues, allowed_tasks: Restricts the jobs to these queues and tasks. None means no restriction.
+        cursor: Only jobs with an id lower than the cursor are returned (id of the last job of the previous page).
+        limit: Maximum number of jobs to return.
+    """
+    filters = build_job_filters(
+        queue=queue,
+        task_name=task_name,
+        submitter=submitter,
+        created_after=created_after,
+        created_before=created_before,
+        allowed_queues=allowed_queues,
+        allowed_tasks=allowed_tasks,
+    )
+    if status is not None:
+        filters.append("j.status = %(status)s::procrastinate_job_status")
+    if cursor is not None:
+        filters.append("j.id < %(cursor)s")
+
+    query = LIST_JOBS_QUERY.replace("{filters}", " AND ".join(filters) or "TRUE")
+    return await connector.execute_query_all_async(
+        query,
+        queue=queue,
+        task_name=task_name,
+        submitter=submitter,
+        status=status,
+        created_after=created_after,
+        created_before=created_before,
+        allowed_queues=allowed_queues,
+        allowed_tasks=allowed_tasks,
+        cursor=cursor,
+        limit=limit,
+    )
+
+
+def build_job_filters(
+    *,
+    queue: str | None = None,
+    task_name: str | None = None,
+    submitter: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    allowed_queues: list[str] | None = None,
+    allowed_tasks: list[str] | None = None,
+) -> list[LiteralString]:
+    """
+    SQL conditions on the `j` jobs alias for the provided filters, using the parameters of the same names.
+    `allowed_queues` and `allowed_tasks` restrict the jobs to these queues and tasks, None means no restriction.
+    """
+    filters: list[LiteralString] = []
+    if queue is not None:
+        filters.append("j.queue_name = %(queue)s")
+    if task_name is not None:
+        filters.append("j.task_name = %(task_name)s")
+    if allowed_queues is not None:
+        filters.append("j.queue_name = ANY(%(allowed_queues)s::text[])")
+    if allowed_tasks is not None:
+        filters.append("j.task_name = ANY(%(allowed_tasks)s::text[])")
+    if submitter is not None:
+        filters.append(
+            "EXISTS (SELECT 1 FROM desktop_agent_job_submissions s"
+            " WHERE s.job_id = j.id AND s.submitter = %(submitter)s)"
+        )
+    if created_after is not None or created_before is not None:
+        # Served by the partial (at, job_id) index on deferred events
+        created_filters: list[LiteralString] = []
+        if created_after is not None:
+            created_filters.append("d.at >= %(created_after)s")
+        if created_before is not None:
+            created_filters.append("d.at < %(created_before)s")
+        filters.append(
+            "EXISTS (SELECT 1 FROM procrastinate_events d"
+            " WHERE d.job_id = j.id AND d.type = 'deferred' AND "
+            + " AND ".join(created_filters)
+            + ")"
+        )
+    return filters
+
+
+async def bulk_update_jobs(
+    connector: BaseConnector,
+    assignments: LiteralString,
+    *,
+    queue: str | None = None,
+    task_name: str | None = None,
+    submitter: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    allowed_queues: list[str] | None = None,
+    allowed_tasks: list[str] | None = None,
+    **params: Any,
+) -> dict[str, Any]:
+    """
+    Applies `assignments` to every waiting job matching the filters in a single statement.
+
+    Args:
+        allowed_queues, allowed_tasks: Restricts the update to these queues and tasks. None means no restriction.
+        params: Parameters used by `assignments`.
+
+    Returns:
+        The number of updated (affected) and running (skipped) jobs, the updated job ids and the
+        number of updated jobs per queue.
+    """
+    filters = build_job_filters(
+        queue=queue,
+        task_name=task_name,
+        submitter=submitter,
+        created_after=created_after,
+        created_before=created_before,
+        allowed_queues=allowed_queues,
+        allowed_tasks=allowed_tasks,
+    )
+
+    query = BULK_UPDATE_QUERY.replace("{filters}", " AND ".join(filters) or "TRUE")
+    query = query.replace("{assignments}", assignments)
+    return await connector.execute_query_one_async(
+        query,
+        queue=queue,
+        task_name=task_name,
+        submitter=submitter,
+        created_after=created_after,
+        created_before=created_before,
+        allowed_queues=allowed_queues,
+        allowed_tasks=allowed_tasks,
+        **params,
+    )
+
+
+async def cancel_jobs(connector: BaseConnector, **filters: Any) -> dict[str, Any]:
+    """Cancels every waiting job matching the filters of `bulk_update_jobs`."""
+    return await bulk_update_jobs(
+        connector, "status = 'cancelled'::procrastinate_job_status", **filters
+    )
+
+
+async def reprioritize_jobs(
+    connector: BaseConnector, priority: int, **filters: Any
+) -> dict[str, Any]:
+    """Sets the priority of every waiting job matching the filters of `bulk_update_jobs`."""
+    return await bulk_update_jobs(
+        connector, "priority = %(priority)s", priority=priority, **filters
+    )
+
+
+async def claim_batch_jobs(
+    connector: BaseConnector,
+    job_id: int,
+    queue: str,
+    task_name: str,
+    worker_id: int | None,
+    match: dict[str, Any],
+    window: float,
+    max_units: int,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """
+    Marks the waiting jobs that can run in the same batch as a running job as started by its worker,
+    and returns their rows. A None value in `match` matches a missing or null kwarg.
+    """
+    filters: list[str] = []
+    params: dict[str, Any] = {}
+    for index, (name, value) in enumerate(match.items()):
+        if value is None:
+            filters.append(f"j.args ->> '{name}' IS NULL")
+        else:
+            filters.append(f"j.args -> '{name}' = %(match_{index})s")
+            params[f"match_{index}"] = Jsonb(value)
+
+    query = CLAIM_BATCH_QUERY.replace("{match}", " AND ".join(filters) or "TRUE")
+    return await connector.execute_query_all_async(
+        query,  # type: ignore[arg-type]
+        job_id=job_id,
+        queue=queue,
+        task_name=task_name,
+        worker_id=worker_id,
+        window=window,
+        max_units=max_units,
+        limit=limit,
+        **params,
+    )
+
+
+async def release_jobs(connector: BaseConnector, job_ids: list[int]) -> None:
+    await connector.execute_query_async(RELEASE_JOBS_QUERY, job_ids=job_ids)
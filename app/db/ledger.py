@@ -0,0 +1,49 @@
+"""Queries over the sales order ledger: the sales orders created from each PO file, by sales order group."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+CREATED_SALES_ORDERS_QUERY: LiteralString = """
+SELECT so_group, po_number, sales_order, job_id, created_at
+FROM desktop_agent_sales_order_ledger
+WHERE file_hash = %(file_hash)s
+    AND created_at >= NOW() - make_interval(secs => %(max_age)s)
+"""
+
+# A group created again after the ledger entry expired replaces the entry
+RECORD_SALES_ORDER_QUERY: LiteralString = """
+INSERT INTO desktop_agent_sales_order_ledger (file_hash, so_group, po_number, sales_order, job_id)
+VALUES (%(file_hash)s, %(so_group)s, %(po_number)s, %(sales_order)s, %(job_id)s)
+ON CONFLICT (file_hash, so_group) DO UPDATE SET
+    po_number = EXCLUDED.po_number,
+    sales_order = EXCLUDED.sales_order,
+    job_id = EXCLUDED.job_id,
+    created_at = NOW()
+"""
+
+
+async def get_created_sales_orders(
+    connector: BaseConnector, file_hash: str, max_age: float
+) -> list[dict[str, Any]]:
+    """Sales orders created from the file during the last `max_age` seconds."""
+    return await connector.execute_query_all_async(
+        CREATED_SALES_ORDERS_QUERY, file_hash=file_hash, max_age=max_age
+    )
+
+
+async def record_sales_order(
+    connector: BaseConnector,
+    file_hash: str,
+    so_group: int,
+    po_number: str | None,
+    sales_order: str,
+    job_id: int | None,
+) -> None:
+    await connector.execute_query_async(
+        RECORD_SALES_ORDER_QUERY,
+        file_hash=file_hash,
+        so_group=so_group,
+        po_number=po_number,
+        sales_order=sales_order,
+        job_id=job_id,
+    )
@@ -0,0 +1,37 @@
+"""Aggregates over the procrastinate jobs of each queue."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+# Only reads unfinished jobs through the status index
+QUEUE_DEPTHS_QUERY: LiteralString = """
+SELECT
+    queue_name AS queue,
+    count(*) FILTER (WHERE status = 'todo') AS todo,
+    count(*) FILTER (WHERE status = 'doing') AS doing
+FROM procrastinate_jobs
+WHERE status IN ('todo', 'doing')
+GROUP BY queue_name
+"""
+
+QUEUE_THROUGHPUT_QUERY: LiteralString = """
+SELECT j.queue_name AS queue, count(*) AS finished
+FROM procrastinate_events e
+JOIN procrastinate_jobs j ON j.id = e.job_id
+WHERE e.type IN ('succeeded', 'failed')
+AND e.at >= NOW() - make_interval(secs => %(window)s)
+GROUP BY j.queue_name
+"""
+
+
+async def get_queue_depths(connector: BaseConnector) -> list[dict[str, Any]]:
+    return await connector.execute_query_all_async(QUEUE_DEPTHS_QUERY)
+
+
+async def get_queue_throughput(
+    connector: BaseConnector, window: float
+) -> list[dict[str, Any]]:
+    """Number of jobs finished per queue during the last `window` seconds."""
+    return await connector.execute_query_all_async(
+        QUEUE_THROUGHPUT_QUERY, window=window
+    )
@@ -0,0 +1,80 @@
+"""Queries over the job results table."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+INSERT_RESULT_QUERY: LiteralString = """
+INSERT INTO desktop_agent_job_results (
+    job_id, task_name, status, worker_id, worker_name, data, duration, units, units_duration
+)
+VALUES (
+    %(job_id)s, %(task_name)s, %(status)s, %(worker_id)s, %(worker_name)s, %(data)s,
+    %(duration)s, %(units)s, %(units_duration)s
+)
+"""
+
+LIST_RESULTS_QUERY: LiteralString = """
+SELECT
+    r.id,
+    r.job_id,
+    r.task_name,
+    r.status,
+    r.worker_id,
+    r.worker_name,
+    r.data,
+    r.created_at
+FROM desktop_agent_job_results r
+WHERE {filters}
+ORDER BY r.id DESC
+LIMIT %(limit)s
+"""
+
+
+async def list_results(
+    connector: BaseConnector,
+    *,
+    job_id: int | None = None,
+    task_name: str | None = None,
+    worker_name: str | None = None,
+    worker_id: int | None = None,
+    allowed_queues: list[str] | None = None,
+    allowed_tasks: list[str] | None = None,
+    cursor: int | None = None,
+    limit: int = 50,
+) -> list[dict[str, Any]]:
+    """
+    Lists job results from the newest to the oldest using keyset pagination.
+    Each filter is backed by a (column, id DESC) index. `allowed_queues` and `allowed_tasks` restrict
+    the results to the jobs of these queues and tasks, None means no restriction.
+    """
+    filters: list[LiteralString] = []
+    if job_id is not None:
+        filters.append("r.job_id = %(job_id)s")
+    if task_name is not None:
+        filters.append("r.task_name = %(task_name)s")
+    if worker_name is not None:
+        filters.append("r.worker_name = %(worker_name)s")
+    if worker_id is not None:
+        filters.append("r.worker_id = %(worker_id)s")
+    if allowed_queues is not None:
+        filters.append(
+            "EXISTS (SELECT 1 FROM procrastinate_jobs j"
+            " WHERE j.id = r.job_id AND j.queue_name = ANY(%(allowed_queues)s::text[]))"
+        )
+    if allowed_tasks is not None:
+        filters.append("r.task_name = ANY(%(allowed_tasks)s::text[])")
+    if cursor is not None:
+        filters.append("r.id < %(cursor)s")
+
+    query = LIST_RESULTS_QUERY.replace("{filters}", " AND ".join(filters) or "TRUE")
+    return await connector.execute_query_all_async(
+        query,
+        job_id=job_id,
+        task_name=task_name,
+        worker_name=worker_name,
+        worker_id=worker_id,
+        allowed_queues=allowed_queues,
+        allowed_tasks=allowed_tasks,
+        cursor=cursor,
+        limit=limit,
+    )
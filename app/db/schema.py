@@ -0,0 +1,273 @@
+"""
+Database objects owned by the desktop agent, on top of the procrastinate schema.
+
+All statements must be idempotent because they are applied on every start of the API and the worker.
+Do not use the percent sign in the statements, they are executed as parametrized queries.
+"""
+
+from procrastinate.connector import BaseConnector
+from app.logging import log
+
+SCHEMA_STATEMENTS: list[str] = [
+    # Job listing walks the primary key backwards (keyset pagination).
+    # These indexes let the filtered listings do the same without scanning finished jobs.
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_jobs_queue_id_idx
+        ON procrastinate_jobs (queue_name, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_jobs_task_id_idx
+        ON procrastinate_jobs (task_name, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_jobs_status_id_idx
+        ON procrastinate_jobs (status, id DESC)
+    """,
+    # Time range filters on the job creation time
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_events_deferred_at_idx
+        ON procrastinate_events (at, job_id) WHERE type = 'deferred'
+    """,
+    # Recent throughput per queue (admission control)
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_events_finished_at_idx
+        ON procrastinate_events (at) WHERE type IN ('succeeded', 'failed')
+    """,
+    # Results posted by the task wrapper. There is no foreign key on purpose,
+    # results must outlive the procrastinate jobs when old jobs are deleted.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_job_results (
+        id bigserial PRIMARY KEY,
+        job_id bigint NOT NULL,
+        task_name character varying(128) NOT NULL,
+        status character varying(32) NOT NULL,
+        worker_id bigint,
+        worker_name text,
+        data jsonb DEFAULT '{}' NOT NULL,
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL
+    )
+    """,
+    # Execution timings of the job, in seconds. units is the number of work items (e.g. sales orders)
+    # and units_duration the time spent on them.
+    """
+    ALTER TABLE desktop_agent_job_results
+        ADD COLUMN IF NOT EXISTS duration double precision,
+        ADD COLUMN IF NOT EXISTS units integer,
+        ADD COLUMN IF NOT EXISTS units_duration double precision
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_job_results_job_id_idx
+        ON desktop_agent_job_results (job_id, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_job_results_task_name_idx
+        ON desktop_agent_job_results (task_name, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_job_results_worker_name_idx
+        ON desktop_agent_job_results (worker_name, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_job_results_worker_id_idx
+        ON desktop_agent_job_results (worker_id, id DESC)
+    """,
+    # Job status transitions are published on the JOB_EVENTS_CHANNEL channel
+    """
+    CREATE OR REPLACE FUNCTION desktop_agent_notify_job_status() RETURNS trigger
+        LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM pg_notify(
+            'desktop_agent_job_events',
+            json_build_object(
+                'event', 'status',
+                'job_id', NEW.id,
+                'queue', NEW.queue_name,
+                'task_name', NEW.task_name,
+                'status', NEW.status,
+                'previous_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+                'attempts', NEW.attempts,
+                'at', NOW()
+            )::text
+        );
+        RETURN NEW;
+    END;
+    $$
+    """,
+    """
+    DROP TRIGGER IF EXISTS desktop_agent_notify_job_inserted ON procrastinate_jobs
+    """,
+    """
+    CREATE TRIGGER desktop_agent_notify_job_inserted
+        AFTER INSERT ON procrastinate_jobs
+        FOR EACH ROW EXECUTE PROCEDURE desktop_agent_notify_job_status()
+    """,
+    """
+    DROP TRIGGER IF EXISTS desktop_agent_notify_job_status_updated ON procrastinate_jobs
+    """,
+    """
+    CREATE TRIGGER desktop_agent_notify_job_status_updated
+        AFTER UPDATE OF status ON procrastinate_jobs
+        FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+        EXECUTE PROCEDURE desktop_agent_notify_job_status()
+    """,
+    # Results are published too, they are written shortly after the final status by the result writer
+    """
+    CREATE OR REPLACE FUNCTION desktop_agent_notify_job_result() RETURNS trigger
+        LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM pg_notify(
+            'desktop_agent_job_events',
+            json_build_object(
+                'event', 'result',
+                'job_id', NEW.job_id,
+                'queue', (SELECT queue_name FROM procrastinate_jobs WHERE id = NEW.job_id),
+                'task_name', NEW.task_name,
+                'status', NEW.status,
+                'at', NEW.created_at
+            )::text
+        );
+        RETURN NEW;
+    END;
+    $$
+    """,
+    """
+    DROP TRIGGER IF EXISTS desktop_agent_notify_job_result_inserted ON desktop_agent_job_results
+    """,
+    """
+    CREATE TRIGGER desktop_agent_notify_job_result_inserted
+        AFTER INSERT ON desktop_agent_job_results
+        FOR EACH ROW EXECUTE PROCEDURE desktop_agent_notify_job_result()
+    """,
+    # Idempotency keys of job submissions. A row without job_id is a submission in progress.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_idempotency_keys (
+        client text NOT NULL,
+        key text NOT NULL,
+        request_hash text NOT NULL,
+        job_id bigint,
+        response jsonb,
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL,
+        expires_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (client, key)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_idempotency_keys_expires_at_idx
+        ON desktop_agent_idempotency_keys (expires_at)
+    """,
+    # API keys, only the SHA-256 hash of the key is stored. NULL allowed queues/tasks means all.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_api_keys (
+        id bigserial PRIMARY KEY,
+        key_hash text NOT NULL UNIQUE,
+        owner text NOT NULL,
+        allowed_queues text[],
+        allowed_tasks text[],
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL,
+        revoked_at timestamp with time zone
+    )
+    """,
+    # API key owner that submitted each job, to filter jobs by submitter
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_job_submissions (
+        job_id bigint PRIMARY KEY REFERENCES procrastinate_jobs (id) ON DELETE CASCADE,
+        api_key_id bigint,
+        submitter text NOT NULL,
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_job_submissions_submitter_idx
+        ON desktop_agent_job_submissions (submitter, job_id DESC)
+    """,
+    # Rolling aggregate of the execution timings of each task, as exponential moving averages:
+    # fixed time per job, time per unit of work and units per job. One row per task.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_task_timings (
+        task_name character varying(128) PRIMARY KEY,
+        samples bigint DEFAULT 0 NOT NULL,
+        job_seconds double precision NOT NULL,
+        unit_seconds double precision,
+        units_per_job double precision,
+        updated_at timestamp with time zone DEFAULT NOW() NOT NULL
+    )
+    """,
+    # Units of work of a waiting job known at submission, e.g. the sales orders of a PO file
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_job_costs (
+        job_id bigint PRIMARY KEY REFERENCES procrastinate_jobs (id) ON DELETE CASCADE,
+        units integer NOT NULL
+    )
+    """,
+    # Worker processes and the queues they listen to (NULL means all queues), for readiness checks.
+    # procrastinate_workers does not record the queues of a worker.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_workers (
+        hostname text NOT NULL,
+        pid integer NOT NULL,
+        name text,
+        queues text[],
+        started_at timestamp with time zone DEFAULT NOW() NOT NULL,
+        last_heartbeat timestamp with time zone DEFAULT NOW() NOT NULL,
+        PRIMARY KEY (hostname, pid)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS desktop_agent_workers_last_heartbeat_idx
+        ON desktop_agent_workers (last_heartbeat)
+    """,
+    # Jobs split into chunk jobs, e.g. a large PO file, and the outcome of each chunk.
+    # The chunk completing the shard defers the fan-in job that merges the chunk outputs.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_shards (
+        parent_job_id bigint PRIMARY KEY,
+        chunks integer NOT NULL,
+        done integer DEFAULT 0 NOT NULL,
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_shard_chunks (
+        parent_job_id bigint NOT NULL
+            REFERENCES desktop_agent_shards (parent_job_id) ON DELETE CASCADE,
+        chunk integer NOT NULL,
+        job_id bigint,
+        status character varying(32) NOT NULL,
+        result jsonb DEFAULT '{}' NOT NULL,
+        finished_at timestamp with time zone DEFAULT NOW() NOT NULL,
+        PRIMARY KEY (parent_job_id, chunk)
+    )
+    """,
+    # Sales orders created from each PO file, recorded as they are created, so that a retried job
+    # resumes at the first sales order group not created yet. No foreign key, entries outlive the jobs.
+    """
+    CREATE TABLE IF NOT EXISTS desktop_agent_sales_order_ledger (
+        file_hash text NOT NULL,
+        so_group integer NOT NULL,
+        po_number text,
+        sales_order text NOT NULL,
+        job_id bigint,
+        created_at timestamp with time zone DEFAULT NOW() NOT NULL,
+        PRIMARY KEY (file_hash, so_group)
+    )
+    """,
+]
+
+JOB_EVENTS_CHANNEL = "desktop_agent_job_events"
+
+
+def apply_schema(connector: BaseConnector) -> None:
+    """Applies the desktop agent schema using an opened synchronous connector."""
+    sync_connector = connector.get_sync_connector()
+    for statement in SCHEMA_STATEMENTS:
+        sync_connector.execute_query(statement)
+    log.info("Desktop agent schema applied")
+
+
+async def apply_schema_async(connector: BaseConnector) -> None:
+    """Applies the desktop agent schema using an opened asynchronous connector."""
+    for statement in SCHEMA_STATEMENTS:
+        await connector.execute_query_async(statement)
+    log.info("Desktop agent schema applied")
@@ -0,0 +1,75 @@
+"""Queries over the sharded jobs tables: a parent job split into chunk jobs merged by a fan-in job."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+from psycopg.types.json import Jsonb
+
+CREATE_SHARD_QUERY: LiteralString = """
+INSERT INTO desktop_agent_shards (parent_job_id, chunks)
+VALUES (%(parent_job_id)s, %(chunks)s)
+ON CONFLICT (parent_job_id) DO NOTHING
+"""
+
+# Records the final outcome of a chunk and counts it once. Returns a row only for the first outcome of the
+# chunk, with the number of chunks done so far. Chunk jobs must not record an outcome they will retry:
+# the fan-in job is deferred on the last count and deletes the chunk files, a later outcome changes nothing.
+COMPLETE_CHUNK_QUERY: LiteralString = """
+WITH recorded AS (
+    INSERT INTO desktop_agent_shard_chunks (parent_job_id, chunk, job_id, status, result)
+    VALUES (%(parent_job_id)s, %(chunk)s, %(job_id)s, %(status)s, %(result)s)
+    ON CONFLICT (parent_job_id, chunk) DO UPDATE SET
+        job_id = EXCLUDED.job_id,
+        status = EXCLUDED.status,
+        result = EXCLUDED.result,
+        finished_at = NOW()
+    RETURNING (xmax = 0) AS is_new
+)
+UPDATE desktop_agent_shards s
+SET done = s.done + 1
+FROM recorded
+WHERE s.parent_job_id = %(parent_job_id)s AND recorded.is_new
+RETURNING s.done, s.chunks
+"""
+
+CHUNK_RESULTS_QUERY: LiteralString = """
+SELECT chunk, job_id, status, result
+FROM desktop_agent_shard_chunks
+WHERE parent_job_id = %(parent_job_id)s
+ORDER BY chunk
+"""
+
+
+async def create_shard(
+    connector: BaseConnector, parent_job_id: int, chunks: int
+) -> None:
+    await connector.execute_query_async(
+        CREATE_SHARD_QUERY, parent_job_id=parent_job_id, chunks=chunks
+    )
+
+
+async def complete_chunk(
+    connector: BaseConnector,
+    parent_job_id: int,
+    chunk: int,
+    job_id: int | None,
+    status: str,
+    result: dict[str, Any],
+) -> bool:
+    """Records the final outcome of a chunk. Returns True for the chunk that completes the shard."""
+    rows = await connector.execute_query_all_async(
+        COMPLETE_CHUNK_QUERY,
+        parent_job_id=parent_job_id,
+        chunk=chunk,
+        job_id=job_id,
+        status=status,
+        result=Jsonb(result),
+    )
+    return bool(rows) and rows[0]["done"] == rows[0]["chunks"]
+
+
+async def get_chunk_results(
+    connector: BaseConnector, parent_job_id: int
+) -> list[dict[str, Any]]:
+    return await connector.execute_query_all_async(
+        CHUNK_RESULTS_QUERY, parent_job_id=parent_job_id
+    )
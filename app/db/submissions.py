@@ -0,0 +1,23 @@
+"""Queries over the job submissions table."""
+
+from typing import LiteralString
+from procrastinate.connector import BaseConnector
+
+RECORD_SUBMISSIONS_QUERY: LiteralString = """
+INSERT INTO desktop_agent_job_submissions (job_id, api_key_id, submitter)
+SELECT job_id, %(api_key_id)s, %(submitter)s
+FROM unnest(%(job_ids)s::bigint[]) AS job_id
+ON CONFLICT (job_id) DO NOTHING
+"""
+
+
+async def record_submissions(
+    connector: BaseConnector, job_ids: list[int], api_key_id: int, submitter: str
+) -> None:
+    """Records the submitter of the jobs in one statement."""
+    await connector.execute_query_async(
+        RECORD_SUBMISSIONS_QUERY,
+        job_ids=job_ids,
+        api_key_id=api_key_id,
+        submitter=submitter,
+    )
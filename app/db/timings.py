@@ -0,0 +1,75 @@
+"""Queries over the task timings aggregate and the costs of waiting jobs."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+# Exponential moving averages, `alpha` is the weight of the new sample.
+# Unit averages are left unchanged by jobs without units.
+UPDATE_TIMINGS_QUERY: LiteralString = """
+INSERT INTO desktop_agent_task_timings AS t (
+    task_name, samples, job_seconds, unit_seconds, units_per_job
+)
+VALUES (
+    %(task_name)s, 1, %(job_seconds)s, %(unit_seconds)s, %(units)s
+)
+ON CONFLICT (task_name) DO UPDATE SET
+    samples = t.samples + 1,
+    job_seconds = t.job_seconds + %(alpha)s * (EXCLUDED.job_seconds - t.job_seconds),
+    unit_seconds = CASE
+        WHEN EXCLUDED.unit_seconds IS NULL THEN t.unit_seconds
+        WHEN t.unit_seconds IS NULL THEN EXCLUDED.unit_seconds
+        ELSE t.unit_seconds + %(alpha)s * (EXCLUDED.unit_seconds - t.unit_seconds)
+    END,
+    units_per_job = CASE
+        WHEN EXCLUDED.units_per_job IS NULL THEN t.units_per_job
+        WHEN t.units_per_job IS NULL THEN EXCLUDED.units_per_job
+        ELSE t.units_per_job + %(alpha)s * (EXCLUDED.units_per_job - t.units_per_job)
+    END,
+    updated_at = NOW()
+"""
+
+TASK_TIMINGS_QUERY: LiteralString = """
+SELECT task_name, samples, job_seconds, unit_seconds, units_per_job, updated_at
+FROM desktop_agent_task_timings
+"""
+
+# Waiting and running jobs in the order procrastinate fetches them
+QUEUED_JOBS_QUERY: LiteralString = """
+SELECT
+    j.id,
+    j.queue_name AS queue,
+    j.task_name,
+    j.status,
+    j.priority,
+    j.scheduled_at,
+    c.units,
+    CASE WHEN j.status = 'doing' THEN (
+        SELECT max(e.at) FROM procrastinate_events e
+        WHERE e.job_id = j.id AND e.type = 'started'
+    ) END AS started_at
+FROM procrastinate_jobs j
+LEFT JOIN desktop_agent_job_costs c ON c.job_id = j.id
+WHERE j.status IN ('todo', 'doing')
+ORDER BY j.status = 'doing' DESC, j.priority DESC, j.id
+"""
+
+RECORD_JOB_COST_QUERY: LiteralString = """
+INSERT INTO desktop_agent_job_costs (job_id, units)
+VALUES (%(job_id)s, %(units)s)
+ON CONFLICT (job_id) DO UPDATE SET units = EXCLUDED.units
+"""
+
+
+async def get_task_timings(connector: BaseConnector) -> list[dict[str, Any]]:
+    return await connector.execute_query_all_async(TASK_TIMINGS_QUERY)
+
+
+async def get_queued_jobs(connector: BaseConnector) -> list[dict[str, Any]]:
+    """Waiting and running jobs, running jobs first then in fetch order (priority, then id)."""
+    return await connector.execute_query_all_async(QUEUED_JOBS_QUERY)
+
+
+async def record_job_cost(connector: BaseConnector, job_id: int, units: int) -> None:
+    await connector.execute_query_async(
+        RECORD_JOB_COST_QUERY, job_id=job_id, units=units
+    )
@@ -0,0 +1,41 @@
+"""Queries over the worker heartbeats table."""
+
+from typing import Any, LiteralString
+from procrastinate.connector import BaseConnector
+
+HEARTBEAT_QUERY: LiteralString = """
+INSERT INTO desktop_agent_workers (hostname, pid, name, queues)
+VALUES (%(hostname)s, %(pid)s, %(name)s, %(queues)s)
+ON CONFLICT (hostname, pid) DO UPDATE
+SET name = EXCLUDED.name, queues = EXCLUDED.queues, last_heartbeat = NOW()
+"""
+
+UNREGISTER_QUERY: LiteralString = """
+DELETE FROM desktop_agent_workers WHERE hostname = %(hostname)s AND pid = %(pid)s
+"""
+
+# Rows of workers that died without unregistering
+PRUNE_QUERY: LiteralString = """
+DELETE FROM desktop_agent_workers
+WHERE last_heartbeat < NOW() - make_interval(secs => %(max_age)s)
+"""
+
+LIVE_WORKERS_QUERY: LiteralString = """
+SELECT hostname, pid, name, queues, started_at, last_heartbeat
+FROM desktop_agent_workers
+WHERE last_heartbeat >= NOW() - make_interval(secs => %(max_age)s)
+ORDER BY hostname, pid
+"""
+
+PING_QUERY: LiteralString = "SELECT 1 AS ok"
+
+
+async def get_live_workers(
+    connector: BaseConnector, max_age: float
+) -> list[dict[str, Any]]:
+    """Workers that sent a heartbeat during the last `max_age` seconds."""
+    return await connector.execute_query_all_async(LIVE_WORKERS_QUERY, max_age=max_age)
+
+
+async def ping(connector: BaseConnector) -> None:
+    await connector.execute_query_one_async(PING_QUERY)
@@ -1 +1,3 @@
 from .job_result import JobResult
+from .api_key import ApiKey
+from .sales_orders import VA01Details, ScreenOrderItem
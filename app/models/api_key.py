@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+
+
+class ApiKey(BaseModel):
+    id: int
+    owner: str
+    allowed_queues: list[str] | None = None
+    allowed_tasks: list[str] | None = None
+
+    def can_defer(self, task_name: str, queue: str) -> bool:
+        """Checks whether this key may defer the task in the queue. None means no restriction."""
+        if self.allowed_tasks is not None and task_name not in self.allowed_tasks:
+            return False
+        if self.allowed_queues is not None and queue not in self.allowed_queues:
+            return False
+        return True
+
+    def can_read(self, task_name: str, queue: str) -> bool:
+        """Checks whether this key may see a job, its events, results and artifacts: the jobs it may defer."""
+        return self.can_defer(task_name, queue)
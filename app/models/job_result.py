@@ -9,3 +9,7 @@ class JobResult(BaseModel):
     task_name: str
     status: str
     data: dict[str, Any]
+    # Execution timings in seconds, units are the work items of the job (e.g. sales orders)
+    duration: float | None = None
+    units: int | None = None
+    units_duration: float | None = None
@@ -0,0 +1,46 @@
+from typing import Annotated, Any
+from pydantic import AfterValidator, BaseModel, model_validator
+from app.mappings import VA01_MAPPINGS, ActionType, Screen
+
+VA01_INITIAL_FIELDS = set(VA01_MAPPINGS["VA01_INITIAL"].elements)
+
+
+def check_screen_name(name: str) -> str:
+    if not isinstance(VA01_MAPPINGS.get(name), Screen):
+        known_screens = [k for k, v in VA01_MAPPINGS.items() if isinstance(v, Screen)]
+        raise ValueError(f"Unknown VA01 screen {name}. Known screens: {known_screens}")
+    return name
+
+
+def check_va01_details(details: dict[str, Any]) -> dict[str, Any]:
+    unknown_fields = set(details) - VA01_INITIAL_FIELDS
+    if unknown_fields:
+        raise ValueError(
+            f"Unknown VA01 initial screen fields {sorted(unknown_fields)}. Known fields: {sorted(VA01_INITIAL_FIELDS)}"
+        )
+    return details
+
+
+ScreenName = Annotated[str, AfterValidator(check_screen_name)]
+VA01Details = Annotated[dict[str, Any], AfterValidator(check_va01_details)]
+
+
+class ActionSpec(BaseModel):
+    type: ActionType
+    target_id: str | None = None
+    description: str | None = None
+
+    @model_validator(mode="after")
+    def check_target_id(self):
+        if self.type == ActionType.CLICK and not self.target_id:
+            raise ValueError("CLICK actions require a target_id")
+        return self
+
+
+class ScreenOrderSpec(BaseModel):
+    name: ScreenName
+    post_actions: list[ActionSpec] | ActionSpec | None = None
+
+
+# A screen_order entry is either a screen name or a screen with post actions
+ScreenOrderItem = ScreenName | ScreenOrderSpec
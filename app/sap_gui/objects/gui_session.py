@@ -102,6 +102,17 @@ class GuiSession:
         """Sends the ENTER virtualkey to a window."""
         return self.sendVKey(VKey.ENTER, window)
 
+    def get_user(self) -> str:
+        """
+        Gets the user logged on in the session, an empty string on the login screen.
+
+        This is a single scripting call, cheap enough to check the session before each job.
+
+        Raises:
+            Exception: If the session no longer exists, e.g. SAP Logon was closed.
+        """
+        return str(self._session.Info.User).strip()
+
     def get_status_info(self) -> StatusInfo | None:
         """Gets current status bar information."""
         try:
@@ -68,5 +68,5 @@ class SAPGuiEngine:
             self.session.findById("wnd[1]/usr/radMULTI_LOGON_OPT1").select()
             self.session.sendVKey(VKey.ENTER, window=1)
 
-        self.session.dismiss_popups_until_none()
+        self.session.dismiss_popups()
         return True
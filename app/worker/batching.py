@@ -0,0 +1,140 @@
+import contextvars
+import time
+from contextvars import ContextVar
+from typing import Any
+from procrastinate import JobContext
+from procrastinate.exceptions import JobAborted
+from procrastinate.jobs import Job, Status
+from procrastinate.utils import async_to_sync
+from app.db.jobs import claim_batch_jobs, release_jobs
+from app.logging import log
+from .timings import exclude_from_timings
+
+_in_batch: ContextVar[bool] = ContextVar("in_batch", default=False)
+
+
+def in_batch() -> bool:
+    """True while running a job claimed by another job, which must not claim jobs itself."""
+    return _in_batch.get()
+
+
+def run_batch(
+    context: JobContext,
+    match: dict[str, Any],
+    window: float,
+    max_jobs: int,
+    max_units: int,
+) -> list[int]:
+    """
+    Runs the waiting jobs of the same task that can share the resources of the running job, e.g. its
+    SAP session, back-to-back in its thread. Returns the ids of the jobs run.
+
+    Jobs deferred within `window` seconds of the running job, with a cost of at most `max_units` and
+    the kwargs in `match`, are claimed until none is left or `max_jobs` ran. Each job runs through its
+    own task wrapper, so it gets its own result, metrics and timings, and is then finished like the
+    worker would: retried by the retry strategy of its task, or aborted if requested. Its run time is
+    left out of the duration of the running job. Claimed jobs not run yet when the running job is
+    asked to stop go back to their queue.
+    """
+    job = context.job
+    job_ids: list[int] = []
+    with exclude_from_timings():
+        while len(job_ids) < max_jobs and not context.should_abort():
+            rows = async_to_sync(
+                claim_batch_jobs,
+                context.app.connector,
+                job.id,
+                job.queue,
+                job.task_name,
+                job.worker_id,
+                match,
+                window,
+                max_units,
+                max_jobs - len(job_ids),
+            )
+            if not rows:
+                break
+            log.info(f"Job {job.id} runs {len(rows)} more {job.task_name} jobs")
+            for index, row in enumerate(rows):
+                if context.should_abort():
+                    release_claimed_jobs(context, [r["id"] for r in rows[index:]])
+                    break
+                run_claimed_job(context, row)
+                job_ids.append(row["id"])
+    return job_ids
+
+
+def run_claimed_job(context: JobContext, row: dict[str, Any]) -> None:
+    """Runs a job claimed by the running job, then finishes it like the worker would. Never raises."""
+    job = Job.from_row(row)
+    if _abort_requested(context, job):
+        log.info(f"Batched job {job.id} ({job.task_name}) aborted before it started")
+        _finish(context, job, Status.ABORTED)
+        return
+
+    job_context = context.evolve(job=job, start_timestamp=time.time())
+    task = context.app.tasks[job.task_name]
+    try:
+        # Its own context, so the timings of the running job are left untouched
+        contextvars.copy_context().run(_run_task, task, job_context, job.task_kwargs)
+    except JobAborted:
+        _finish(context, job, Status.ABORTED)
+    except Exception as e:
+        job_retry = task.get_retry_exception(exception=e, job=job)
+        if job_retry is None:
+            log.error(f"Batched job {job.id} ({job.task_name}) failed: {e}")
+            _finish(context, job, Status.FAILED)
+            return
+
+        decision = job_retry.retry_decision
+        log.warning(f"Batched job {job.id} ({job.task_name}) failed, to retry: {e}")
+        try:
+            async_to_sync(
+                context.app.job_manager.retry_job,
+                job,
+                decision.retry_at,
+                decision.priority,
+                decision.queue,
+                decision.lock,
+            )
+        except Exception as e:
+            log.error(f"Failed to retry batched job {job.id}: {e}")
+    else:
+        _finish(context, job, Status.SUCCEEDED)
+
+
+def release_claimed_jobs(context: JobContext, job_ids: list[int]) -> None:
+    """Puts claimed jobs back in their queue without running them. Never raises."""
+    log.info(f"Job {context.job.id} stops, releasing batched jobs {job_ids}")
+    try:
+        async_to_sync(release_jobs, context.app.connector, job_ids)
+    except Exception as e:
+        log.error(f"Failed to release batched jobs {job_ids}: {e}")
+
+
+def _abort_requested(context: JobContext, job: Job) -> bool:
+    # Aborts requested after the job was claimed are only visible in the database
+    if job.abort_requested:
+        return True
+    try:
+        job_ids = async_to_sync(
+            context.app.job_manager.list_jobs_to_abort_async, job.queue
+        )
+    except Exception as e:
+        log.warning(f"Failed to check if batched job {job.id} was aborted: {e}")
+        return False
+    return job.id in job_ids
+
+
+def _finish(context: JobContext, job: Job, status: Status) -> None:
+    try:
+        async_to_sync(
+            context.app.job_manager.finish_job_by_id_async, job.id, status, False
+        )
+    except Exception as e:
+        log.error(f"Failed to mark batched job {job.id} as {status.value}: {e}")
+
+
+def _run_task(task: Any, context: JobContext, kwargs: dict[str, Any]) -> Any:
+    _in_batch.set(True)
+    return task(context, **kwargs)
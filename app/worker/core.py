@@ -1,11 +1,20 @@
 import asyncio
 import functools
+import inspect
 import sys
 from typing import Any, Callable, Optional
 from app.models import JobResult
 from app.config import config
+from app.logging import log
 from procrastinate import App, PsycopgConnector, JobContext
-from pprint import pprint
+from procrastinate import tasks as procrastinate_tasks
+from procrastinate.jobs import JobDeferrer
+from .heartbeat import WorkerHeartbeat
+from .locks import HostLock, HostLockRetryStrategy, with_host_lock
+from .metrics import worker_activity, observe_queue_wait, observe_queue_wait_async
+from .results import ResultPublisher
+from .sinks import ResultSink, PostgresSink, WebhookSink, WindmillSink
+from .timings import JobTimings, start_job_timings
 
 
 # Set event loop policy only on Windows
@@ -19,53 +28,180 @@ app = App(
 )
 
 
+def create_result_sinks() -> list[ResultSink]:
+    sinks: list[ResultSink] = []
+    if "postgres" in config.worker.result_sinks:
+        sinks.append(
+            PostgresSink(
+                conninfo=config.db.url,
+                timing_smoothing=config.worker.timing_smoothing,
+            )
+        )
+    if "webhook" in config.worker.result_sinks:
+        sinks.append(
+            WebhookSink(
+                url=config.worker.result_webhook_url,
+                headers=config.worker.result_webhook_headers,
+                timeout=config.worker.result_webhook_timeout,
+            )
+        )
+    if "windmill" in config.worker.result_sinks:
+        sinks.append(
+            WindmillSink(
+                instance_url=config.wmill.instance_url,
+                token=config.wmill.super_admin_token,
+                run_path=config.worker.result_windmill_run_path,
+            )
+        )
+    return sinks
+
+
+result_publisher = ResultPublisher(
+    sinks=create_result_sinks(),
+    spool_dir=config.worker.result_spool_dir,
+    max_queue_size=config.worker.result_queue_size,
+    batch_size=config.worker.result_batch_size,
+    flush_interval=config.worker.result_flush_interval,
+    max_retry_delay=config.worker.result_retry_max_delay,
+)
+
+heartbeat = WorkerHeartbeat(
+    conninfo=config.db.url,
+    name=config.worker.name,
+    queues=config.worker.get_queues(),
+    interval=config.worker.heartbeat_interval,
+)
+
+
 def post_result(result: JobResult) -> None:
-    print("Post task result function!")
-    pprint(result.model_dump())
+    """Queues the result to be published to the result sinks. Never waits for a sink."""
+    log.info(f"Job {result.id} ({result.task_name}) {result.status}")
+    if result.id is None:
+        log.warning("Result has no job id, it will not be persisted")
+        return
+    if not result_publisher.submit(result):
+        log.error(
+            f"Result of job {result.id} ({result.task_name}) was not published to every sink"
+        )
+
+
+def build_result(
+    context: JobContext | None,
+    status: str,
+    data: Any,
+    timings: JobTimings,
+) -> JobResult:
+    return JobResult(
+        id=context.job.id if context else None,
+        status=status,
+        task_name=context.job.task_name if context else "unknown",
+        worker_name=context.worker_name if context else "unknown",
+        worker_id=context.job.worker_id if context else None,
+        data=data,
+        duration=timings.duration,
+        units=timings.units or None,
+        units_duration=timings.units_duration if timings.units else None,
+    )
+
+
+def post_success(context: JobContext | None, result: Any, timings: JobTimings) -> None:
+    post_result(build_result(context, "succeeded", result, timings))
+
+
+def post_failure(
+    context: JobContext | None, error: Exception, timings: JobTimings
+) -> None:
+    error_object = {
+        "type": type(error).__name__,
+        "message": str(error),
+    }
+    post_result(build_result(context, "failed", error_object, timings))
+
+
+def configure_task_for(context: JobContext, name: str, **options) -> JobDeferrer:
+    """
+    Configures a task to defer jobs from a running job, through the app running it.
+
+    `context.app.configure_task` defers through the app the task is registered on, which is not open
+    in the workers run per queue. Task defaults are not applied: pass the queue, lock and priority.
+    """
+    return procrastinate_tasks.configure_task(
+        name=name, job_manager=context.app.job_manager, **options
+    )
 
 
 # Use this decorator to define tasks
-def task(original_func: Optional[Callable] = None, **kwargs):
+def task(
+    original_func: Optional[Callable] = None,
+    host_lock: str | None = None,
+    **kwargs,
+):
     """
-    Task middleware to define procrastinate tasks and do something with the result
+    Task middleware to define procrastinate tasks and do something with the result.
+
+    Coroutine functions are awaited on the worker's event loop, so I/O-bound tasks run concurrently.
+    Regular functions are run in a thread by procrastinate, one at a time per lock as before.
+    Every job is reported to the worker metrics: queue wait, run time, outcome and running jobs.
+
+    `host_lock` names a lock held by one job at a time per host, e.g. the SAP GUI of the desktop,
+    while `lock` is the procrastinate lock shared by the whole fleet. A job started while its host lock
+    is held goes back to its queue and is retried shortly after, on top of the `retry` of the task.
     """
 
     def wrap(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def new_func(*job_args, **job_kwargs) -> Any:
-            context: JobContext = job_args[0] if job_args else None
-
-            try:
-                result = func(*job_args, **job_kwargs)
-                job_result = JobResult(
-                    id=context.job.id if context else None,
-                    status="succeeded",
-                    task_name=context.job.task_name if context else "unknown",
-                    worker_name=context.worker_name if context else "unknown",
-                    worker_id=context.job.worker_id if context else None,
-                    data=result,
-                )
-                post_result(job_result)
-                return result
-            except Exception as e:
-                # Post error result
-                error_object = {
-                    "type": type(e).__name__,
-                    "message": str(e),
-                }
-                job_result = JobResult(
-                    id=context.job.id if context else None,
-                    status="failed",
-                    task_name=context.job.task_name if context else "unknown",
-                    worker_name=context.worker_name if context else "unknown",
-                    worker_id=context.job.worker_id if context else None,
-                    data=error_object,
-                )
-                post_result(job_result)
-                # Re-raise the exception to maintain the expected error behavior
-                raise
-
-        return app.task(**kwargs)(new_func)
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def new_func(*job_args, **job_kwargs) -> Any:
+                context: JobContext = job_args[0] if job_args else None
+                timings = start_job_timings()
+                worker_activity.job_started(context)
+                await observe_queue_wait_async(context)
+                status = "failed"
+
+                try:
+                    result = await func(*job_args, **job_kwargs)
+                    status = "succeeded"
+                    post_success(context, result, timings)
+                    return result
+                except Exception as e:
+                    post_failure(context, e, timings)
+                    # Re-raise the exception to maintain the expected error behavior
+                    raise
+                finally:
+                    worker_activity.job_finished(context, status, timings.duration)
+
+        else:
+
+            @functools.wraps(func)
+            def new_func(*job_args, **job_kwargs) -> Any:
+                context: JobContext = job_args[0] if job_args else None
+                timings = start_job_timings()
+                worker_activity.job_started(context)
+                observe_queue_wait(context)
+                status = "failed"
+
+                try:
+                    result = func(*job_args, **job_kwargs)
+                    status = "succeeded"
+                    post_success(context, result, timings)
+                    return result
+                except Exception as e:
+                    post_failure(context, e, timings)
+                    # Re-raise the exception to maintain the expected error behavior
+                    raise
+                finally:
+                    worker_activity.job_finished(context, status, timings.duration)
+
+        if host_lock is None:
+            return app.task(**kwargs)(new_func)
+
+        new_func = with_host_lock(new_func, HostLock(config.db.url, host_lock))
+        new_task = app.task(**kwargs)(new_func)
+        new_task.retry_strategy = HostLockRetryStrategy(
+            config.worker.host_lock_retry_delay, new_task.retry_strategy
+        )
+        return new_task
 
     if original_func is None:
         return wrap
@@ -0,0 +1,106 @@
+import os
+import socket
+import threading
+import psycopg
+from app.db.workers import HEARTBEAT_QUERY, UNREGISTER_QUERY, PRUNE_QUERY
+from app.logging import log
+
+
+class WorkerHeartbeat:
+    """
+    Periodically records the worker process and its queues in the workers table from a background thread.
+
+    The API reads these heartbeats to report whether each queue has a live worker.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        name: str | None = None,
+        queues: list[str] | None = None,
+        interval: float = 10.0,
+        prune_after: float = 86400.0,
+    ):
+        self.conninfo = conninfo
+        self.name = name
+        self.queues = queues
+        self.interval = interval
+        self.prune_after = prune_after
+        self.hostname = socket.gethostname()
+        self.pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._connection: psycopg.Connection | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Starts the heartbeat thread. Calling it more than once is a no-op."""
+        if self.is_running:
+            return
+        # The pid changes in sub-processes
+        self.pid = os.getpid()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="worker-heartbeat", daemon=True
+        )
+        self._thread.start()
+        log.info(f"Worker heartbeat started ({self.hostname}:{self.pid})")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stops the heartbeat thread and removes the worker from the table."""
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        try:
+            self._get_connection().execute(
+                UNREGISTER_QUERY, {"hostname": self.hostname, "pid": self.pid}
+            )
+        except Exception as e:
+            log.warning(f"Failed to unregister worker heartbeat: {e}")
+        self._close_connection()
+        log.info("Worker heartbeat stopped")
+
+    def _run(self) -> None:
+        self._prune()
+        while not self._stop_event.is_set():
+            self._beat()
+            self._stop_event.wait(self.interval)
+
+    def _beat(self) -> None:
+        try:
+            self._get_connection().execute(
+                HEARTBEAT_QUERY,
+                {
+                    "hostname": self.hostname,
+                    "pid": self.pid,
+                    "name": self.name,
+                    "queues": self.queues,
+                },
+            )
+        except Exception as e:
+            log.warning(f"Failed to send worker heartbeat: {e}")
+            self._close_connection()
+
+    def _prune(self) -> None:
+        try:
+            self._get_connection().execute(PRUNE_QUERY, {"max_age": self.prune_after})
+        except Exception as e:
+            log.warning(f"Failed to prune stale worker heartbeats: {e}")
+            self._close_connection()
+
+    def _get_connection(self) -> psycopg.Connection:
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg.connect(self.conninfo, autocommit=True)
+        return self._connection
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
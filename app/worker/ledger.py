@@ -0,0 +1,70 @@
+import hashlib
+from pathlib import Path
+from procrastinate.connector import BaseConnector
+from procrastinate.utils import async_to_sync
+from app.db import ledger as ledger_db
+from app.logging import log
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    checksum = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+class SalesOrderLedger:
+    """
+    Sales orders already created from a PO file, keyed by the hash of the file and the sales order group.
+
+    Each sales order is recorded as soon as SAP returns its number, so a job retried or resubmitted after
+    a crash skips the groups already created instead of creating them again. Entries older than `max_age`
+    are ignored, a file submitted again after that is processed from scratch.
+    Used from the thread of a sync task.
+    """
+
+    def __init__(
+        self,
+        connector: BaseConnector,
+        file_hash: str,
+        job_id: int | None = None,
+        max_age: float = 604800.0,
+    ):
+        self.connector = connector
+        self.file_hash = file_hash
+        self.job_id = job_id
+        self.max_age = max_age
+        self._created: dict[int, str] = {}
+
+    def load(self) -> int:
+        """Loads the sales orders already created from the file. Returns their number."""
+        rows = async_to_sync(
+            ledger_db.get_created_sales_orders,
+            self.connector,
+            self.file_hash,
+            self.max_age,
+        )
+        self._created = {row["so_group"]: row["sales_order"] for row in rows}
+        return len(self._created)
+
+    def get(self, so_group: int) -> str | None:
+        return self._created.get(so_group)
+
+    def record(self, so_group: int, po_number: str | None, sales_order: str) -> None:
+        """Records a created sales order. A failure is logged, it must not fail the sales order."""
+        self._created[so_group] = sales_order
+        try:
+            async_to_sync(
+                ledger_db.record_sales_order,
+                self.connector,
+                self.file_hash,
+                so_group,
+                po_number,
+                sales_order,
+                self.job_id,
+            )
+        except Exception as e:
+            log.warning(
+                f"Failed to record sales order {sales_order} of group {so_group} in the ledger: {e}"
+            )
@@ -0,0 +1,119 @@
+import contextlib
+import functools
+import inspect
+import socket
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Iterator, LiteralString
+import psycopg
+from procrastinate.jobs import Job
+from procrastinate.retry import BaseRetryStrategy, RetryDecision
+from app.logging import log
+
+TRY_LOCK_QUERY: LiteralString = (
+    "SELECT pg_try_advisory_lock(hashtextextended(%(key)s, 0)) AS locked"
+)
+
+# Keys of the host locks held by the running job, so that jobs it runs itself do not wait for them
+_held_keys: ContextVar[frozenset[str]] = ContextVar("held_keys", default=frozenset())
+
+
+class HostLockBusy(Exception):
+    """Raised when a job starts while another job holds its host lock, so it goes back to its queue."""
+
+
+class HostLock:
+    """
+    Lock held by at most one job at a time on this host, across all the worker processes of the host.
+
+    Unlike a procrastinate lock, which serializes the jobs of the whole fleet, jobs on other hosts run
+    in parallel. It is a Postgres advisory lock keyed by the lock name and the hostname, held on a
+    dedicated connection for the duration of the job, so it is released even if the process dies.
+    It is reentrant: a job run by the job holding the lock, e.g. in a batch, runs under that lock.
+    It never waits: a job started while the lock is held raises HostLockBusy, so that it does not tie
+    up a worker slot while `doing`, and is retried later by HostLockRetryStrategy.
+    """
+
+    def __init__(self, conninfo: str, name: str, hostname: str | None = None):
+        self.conninfo = conninfo
+        self.name = name
+        self.hostname = hostname or socket.gethostname()
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.hostname}"
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[None]:
+        if self.key in _held_keys.get():
+            yield
+            return
+
+        # Closing the connection releases the lock
+        with psycopg.connect(self.conninfo, autocommit=True) as connection:
+            row = connection.execute(TRY_LOCK_QUERY, {"key": self.key}).fetchone()
+            if not row[0]:
+                raise HostLockBusy(f"Host lock {self.key} is held by another job")
+            token = _held_keys.set(_held_keys.get() | {self.key})
+            try:
+                yield
+            finally:
+                _held_keys.reset(token)
+
+    @contextlib.asynccontextmanager
+    async def hold_async(self) -> AsyncIterator[None]:
+        if self.key in _held_keys.get():
+            yield
+            return
+
+        async with await psycopg.AsyncConnection.connect(
+            self.conninfo, autocommit=True
+        ) as connection:
+            cursor = await connection.execute(TRY_LOCK_QUERY, {"key": self.key})
+            row = await cursor.fetchone()
+            if not row[0]:
+                raise HostLockBusy(f"Host lock {self.key} is held by another job")
+            token = _held_keys.set(_held_keys.get() | {self.key})
+            try:
+                yield
+            finally:
+                _held_keys.reset(token)
+
+
+def with_host_lock(func: Callable, lock: HostLock) -> Callable:
+    """Wraps a sync or async task function so that it runs while holding the host lock."""
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def locked_func(*args, **kwargs) -> Any:
+            async with lock.hold_async():
+                return await func(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(func)
+        def locked_func(*args, **kwargs) -> Any:
+            with lock.hold():
+                return func(*args, **kwargs)
+
+    return locked_func
+
+
+class HostLockRetryStrategy(BaseRetryStrategy):
+    """
+    Puts a job back in its queue for `delay` seconds when its host lock is busy, however many times,
+    and leaves any other error to the retry strategy of its task.
+    """
+
+    def __init__(self, delay: int, strategy: BaseRetryStrategy | None = None):
+        self.delay = delay
+        self.strategy = strategy
+
+    def get_retry_decision(
+        self, *, exception: BaseException, job: Job
+    ) -> RetryDecision | None:
+        if isinstance(exception, HostLockBusy):
+            log.info(f"Job {job.id} ({job.task_name}) put back: {exception}")
+            return RetryDecision(retry_in={"seconds": self.delay})
+        if self.strategy is None:
+            return None
+        return self.strategy.get_retry_decision(exception=exception, job=job)
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from procrastinate import JobContext
+from procrastinate.utils import async_to_sync
+from app.config import config
+from app.db.jobs import get_job_queued_at
+from app.logging import log
+
+# Jobs range from sub-second I/O calls to SAP runs of an hour or more
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+QUEUE_WAIT = Histogram(
+    "desktop_agent_worker_queue_wait_seconds",
+    "Time jobs waited in their queue, from scheduled or deferred to started",
+    ["queue", "task_name"],
+    buckets=JOB_BUCKETS,
+)
+
+JOB_DURATION = Histogram(
+    "desktop_agent_worker_job_duration_seconds",
+    "Execution time of jobs",
+    ["queue", "task_name"],
+    buckets=JOB_BUCKETS,
+)
+
+JOBS = Counter(
+    "desktop_agent_worker_jobs",
+    "Jobs run by this worker by outcome",
+    ["queue", "task_name", "status"],
+)
+
+
+@dataclass
+class RunningJob:
+    queue: str
+    task_name: str
+    started_at: float  # time.monotonic()
+
+
+class WorkerActivity(Collector):
+    """
+    Running jobs and the last SAP action of this worker process, exposed at scrape time.
+
+    The task wrapper reports each job start and end. Jobs of SAP queues also count as SAP actions,
+    as do the units of work tasks report with `record_sap_action`, so a stuck SAP session shows up as
+    a growing time since the last action while a job is running.
+    """
+
+    def __init__(self, is_sap_queue: Callable[[str], bool]):
+        self.is_sap_queue = is_sap_queue
+        self.last_sap_action: float | None = None
+        self._running: dict[int, RunningJob] = {}
+        self._lock = threading.Lock()
+
+    def job_started(self, context: JobContext | None) -> None:
+        if context is None:
+            return
+        job = context.job
+        with self._lock:
+            self._running[job.id] = RunningJob(
+                queue=job.queue, task_name=job.task_name, started_at=time.monotonic()
+            )
+        if self.is_sap_queue(job.queue):
+            self.record_sap_action()
+
+    def job_finished(
+        self, context: JobContext | None, status: str, duration: float
+    ) -> None:
+        if context is None:
+            return
+        job = context.job
+        with self._lock:
+            self._running.pop(job.id, None)
+        JOB_DURATION.labels(job.queue, job.task_name).observe(duration)
+        JOBS.labels(job.queue, job.task_name, status).inc()
+        if self.is_sap_queue(job.queue):
+            self.record_sap_action()
+
+    def record_sap_action(self) -> None:
+        self.last_sap_action = time.monotonic()
+
+    def collect(self) -> Iterable[Metric]:
+        now = time.monotonic()
+        with self._lock:
+            running = dict(self._running)
+
+        current = GaugeMetricFamily(
+            "desktop_agent_worker_current_job_seconds",
+            "Seconds since each running job started",
+            labels=["job_id", "queue", "task_name"],
+        )
+        per_queue: dict[str, int] = {}
+        for job_id, job in running.items():
+            current.add_metric(
+                [str(job_id), job.queue, job.task_name], now - job.started_at
+            )
+            per_queue[job.queue] = per_queue.get(job.queue, 0) + 1
+        yield current
+
+        running_jobs = GaugeMetricFamily(
+            "desktop_agent_worker_running_jobs",
+            "Jobs running in this worker process",
+            labels=["queue"],
+        )
+        for queue, count in per_queue.items():
+            running_jobs.add_metric([queue], count)
+        yield running_jobs
+
+        if self.last_sap_action is not None:
+            yield GaugeMetricFamily(
+                "desktop_agent_worker_last_sap_action_age_seconds",
+                "Seconds since the last SAP action of this worker",
+                value=now - self.last_sap_action,
+            )
+
+
+worker_activity = WorkerActivity(is_sap_queue=config.worker.is_sap_queue)
+REGISTRY.register(worker_activity)
+
+
+def record_sap_action() -> None:
+    """Marks that the running task just acted in SAP, e.g. saved a sales order."""
+    worker_activity.record_sap_action()
+
+
+def _observe_queue_wait(context: JobContext, queued_at: datetime | None) -> None:
+    if queued_at is None:
+        return
+    wait = context.start_timestamp - queued_at.timestamp()
+    QUEUE_WAIT.labels(context.job.queue, context.job.task_name).observe(max(0.0, wait))
+
+
+def observe_queue_wait(context: JobContext | None) -> None:
+    """Observes how long the job waited. Called from the thread of a sync task, never raises."""
+    if context is None or context.job.id is None:
+        return
+    try:
+        queued_at = async_to_sync(
+            get_job_queued_at, context.app.connector, context.job.id
+        )
+        _observe_queue_wait(context, queued_at)
+    except Exception as e:
+        log.debug(f"Failed to observe the queue wait of job {context.job.id}: {e}")
+
+
+async def observe_queue_wait_async(context: JobContext | None) -> None:
+    """Observes how long the job waited. Never raises."""
+    if context is None or context.job.id is None:
+        return
+    try:
+        queued_at = await get_job_queued_at(context.app.connector, context.job.id)
+        _observe_queue_wait(context, queued_at)
+    except Exception as e:
+        log.debug(f"Failed to observe the queue wait of job {context.job.id}: {e}")
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> None:
+    """Serves the metrics of this process on http://host:port/metrics from a daemon thread."""
+    start_http_server(port, addr=host)
+    log.info(f"Worker metrics served on http://{host}:{port}/metrics")
@@ -0,0 +1,227 @@
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from app.logging import log
+from app.models import JobResult
+from .sinks import ResultSink, SpooledResult
+
+
+class SinkFlusher:
+    """
+    Publishes the spooled results of one sink from a background thread.
+
+    Results are read from the sink's spool directory in submission order, published in batches and deleted
+    once delivered. A failed batch is retried with exponential backoff, without blocking the other sinks.
+    """
+
+    def __init__(
+        self,
+        sink: ResultSink,
+        spool_dir: Path,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_retry_delay: float = 300.0,
+    ):
+        self.sink = sink
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.failures = 0
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"result-sink-{self.sink.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stops after a last attempt to flush. Undelivered results stay in the spool for the next start."""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.sink.close()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def spool(self, result: JobResult, name: str) -> None:
+        """Writes the result to the spool directory. The rename makes a partially written file invisible."""
+        temp_path = self.spool_dir / f".{name}.tmp"
+        temp_path.write_text(result.model_dump_json(), encoding="utf-8")
+        os.replace(temp_path, self.spool_dir / name)
+
+    def _spooled_files(self) -> list[Path]:
+        # Names start with the submission time in nanoseconds, so they sort in submission order
+        return sorted(self.spool_dir.glob("*.json"))
+
+    def _run(self) -> None:
+        while True:
+            delivered = self._flush_batch()
+            if self._stop_event.is_set():
+                break
+            if delivered:
+                # Keep flushing while there is a backlog
+                continue
+            self._wakeup.wait(self._next_delay())
+            self._wakeup.clear()
+
+    def _next_delay(self) -> float:
+        if self.failures == 0:
+            return self.flush_interval
+        return min(self.flush_interval * 2**self.failures, self.max_retry_delay)
+
+    def _flush_batch(self) -> bool:
+        """Publishes the oldest spooled results. Returns True if a full batch was delivered."""
+        files = self._spooled_files()[: self.batch_size]
+        if not files:
+            return False
+
+        batch: list[SpooledResult] = []
+        for path in files:
+            try:
+                batch.append(
+                    SpooledResult(
+                        id=path.stem,
+                        result=JobResult.model_validate_json(
+                            path.read_text(encoding="utf-8")
+                        ),
+                    )
+                )
+            except Exception as e:
+                # Keep the unreadable file aside instead of retrying it forever
+                log.error(f"Invalid spooled result {path}: {e}")
+                path.replace(path.with_suffix(".invalid"))
+
+        if not batch:
+            return True
+
+        try:
+            self.sink.publish(batch)
+        except Exception as e:
+            self.failures += 1
+            log.warning(
+                f"Failed to publish {len(batch)} job results to {self.sink.name} "
+                f"(attempt {self.failures}, retrying in {self._next_delay():.0f}s): {e}"
+            )
+            return False
+
+        for item in batch:
+            (self.spool_dir / f"{item.id}.json").unlink(missing_ok=True)
+        if self.failures:
+            log.info(f"Publishing job results to {self.sink.name} recovered")
+        self.failures = 0
+        log.debug(f"Published {len(batch)} job results to {self.sink.name}")
+        return len(files) == self.batch_size
+
+
+class ResultPublisher:
+    """
+    Publishes job results to every sink (database, Windmill, webhooks) without blocking the tasks.
+
+    `submit` puts the result in a bounded in-memory queue, or spools it itself when the queue is full. A
+    background thread writes the queued results to a spool
+    directory per sink right away, and a flusher per sink publishes the spooled results in batches with
+    retries, so a slow or unavailable sink never delays or fails a job, and results survive a worker restart.
+    """
+
+    def __init__(
+        self,
+        sinks: list[ResultSink],
+        spool_dir: str | Path,
+        max_queue_size: int = 1000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_retry_delay: float = 300.0,
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.flushers = [
+            SinkFlusher(
+                sink,
+                self.spool_dir / sink.name,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                max_retry_delay=max_retry_delay,
+            )
+            for sink in sinks
+        ]
+        self._queue: queue.Queue[JobResult] = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Starts the background threads. Results spooled by a previous run are published first."""
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        for flusher in self.flushers:
+            flusher.start()
+        self._thread = threading.Thread(
+            target=self._run, name="result-spooler", daemon=True
+        )
+        self._thread.start()
+        log.info(
+            f"Result publisher started with sinks: {', '.join(f.sink.name for f in self.flushers)}"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Spools the queued results, then stops the flushers after a last flush."""
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        for flusher in self.flushers:
+            flusher.stop(timeout)
+        log.info("Result publisher stopped")
+
+    def submit(self, result: JobResult) -> bool:
+        """
+        Queues a result to be published. Never waits for the queue: when it is full, the result is
+        written to the spool directories from the calling thread instead.
+
+        Returns:
+            True if the result was queued or spooled, False if it could not be spooled for every sink.
+        """
+        try:
+            self._queue.put_nowait(result)
+            return True
+        except queue.Full:
+            log.warning(
+                f"Result queue is full, spooling result of job {result.id} ({result.task_name}) directly"
+            )
+            return self._spool(result)
+
+    def _run(self) -> None:
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                result = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._spool(result)
+
+    def _spool(self, result: JobResult) -> bool:
+        """Writes the result to the spool directory of every sink. Returns False if any write failed."""
+        name = f"{time.time_ns()}-{result.id}.json"
+        spooled = True
+        for flusher in self.flushers:
+            try:
+                flusher.spool(result, name)
+                flusher.notify()
+            except Exception as e:
+                spooled = False
+                log.error(
+                    f"Failed to spool result of job {result.id} for {flusher.sink.name}: {e}"
+                )
+        return spooled
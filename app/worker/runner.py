@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+from procrastinate import App, PsycopgConnector, signals
+from app.config import config
+from app.logging import log
+
+
+def create_queue_app(app: App, pool_size: int) -> App:
+    """
+    Creates an app running the tasks of `app` with its own connection pool.
+
+    The tasks stay registered on `app`, whose connector is not open in this mode, so tasks must defer
+    jobs through the app running them with `configure_task_for`, never with `Task.configure`.
+    """
+    queue_app = App(
+        connector=PsycopgConnector(
+            conninfo=config.db.url, min_size=1, max_size=pool_size
+        ),
+        import_paths=app.import_paths,
+        worker_defaults=app.worker_defaults,
+    )
+    queue_app.tasks = app.tasks
+    queue_app.periodic_registry = app.periodic_registry
+    return queue_app
+
+
+async def run_queue_workers(
+    app: App,
+    queue_concurrency: dict[str, int],
+    pool_sizes: dict[str, int] | None = None,
+    name: str | None = None,
+) -> None:
+    """
+    Runs one procrastinate worker per queue in this process, each with its own concurrency and connection pool,
+    so a long job in one queue never holds the job slots or the connections of another queue.
+
+    Runs until a stop signal is received or one of the workers fails, then stops all workers gracefully.
+
+    Args:
+        queue_concurrency: Number of jobs run at the same time in each queue.
+        pool_sizes: Maximum connections of each queue's pool, defaults to the concurrency plus two
+            (fetching jobs and heartbeats). Listening for new jobs uses a separate connection.
+    """
+    pool_sizes = pool_sizes or {}
+    async with contextlib.AsyncExitStack() as stack:
+        queue_apps: dict[str, App] = {}
+        for queue, concurrency in queue_concurrency.items():
+            queue_apps[queue] = create_queue_app(
+                app, pool_sizes.get(queue, concurrency + 2)
+            )
+            await stack.enter_async_context(queue_apps[queue].open_async())
+
+        workers = [
+            asyncio.create_task(
+                queue_app.run_worker_async(
+                    queues=[queue],
+                    concurrency=queue_concurrency[queue],
+                    name=f"{name}:{queue}" if name else queue,
+                    # A single handler below stops all the workers
+                    install_signal_handlers=False,
+                ),
+                name=f"worker-{queue}",
+            )
+            for queue, queue_app in queue_apps.items()
+        ]
+        log.info(
+            "Started queue workers: "
+            + ", ".join(f"{q} (concurrency {c})" for q, c in queue_concurrency.items())
+        )
+
+        def stop_workers() -> None:
+            log.info("Stopping queue workers...")
+            for worker in workers:
+                worker.cancel()
+
+        try:
+            with signals.on_stop(stop_workers):
+                done, _ = await asyncio.wait(
+                    workers, return_when=asyncio.FIRST_EXCEPTION
+                )
+        except asyncio.CancelledError:
+            # e.g. KeyboardInterrupt on Windows, where signal handlers are not installed
+            stop_workers()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        failed = [
+            worker
+            for worker in done
+            if not worker.cancelled() and worker.exception() is not None
+        ]
+        for worker in failed:
+            log.error(f"{worker.get_name()} failed: {worker.exception()!r}")
+        if failed:
+            stop_workers()
+
+        # Workers finish their running jobs when cancelled
+        await asyncio.gather(*workers, return_exceptions=True)
+        if failed:
+            raise failed[0].exception()
@@ -0,0 +1,102 @@
+import threading
+import pythoncom
+from app.config import config
+from app.logging import log
+from app.sap_gui import SAPGuiEngine, GuiSession
+
+
+class SAPSessionProvider:
+    """
+    Logged-on SAP GUI session shared by the SAP tasks of the worker process.
+
+    SAP Logon is started, the connection opened and the user logged on once, by `warm_up` at worker
+    start or by the first SAP job, and they stay up in SAP GUI across jobs. The scripting objects are
+    COM objects bound to the apartment of the thread that created them, so each thread running SAP
+    tasks initializes COM and attaches its own engine to the open connection, which is cheap, and keeps
+    it for the next jobs it runs. Before each job `get_session` checks the session with a single
+    scripting call, and only reattaches when SAP Logon or the connection is gone, and only logs on
+    again when the session was logged off.
+    """
+
+    def __init__(
+        self,
+        connection_name: str,
+        window_title: str,
+        executable_path: str,
+        username: str | None,
+        password: str | None,
+    ):
+        self.connection_name = connection_name
+        self.window_title = window_title
+        self.executable_path = executable_path
+        self.username = username
+        self.password = password
+        self._local = threading.local()  # COM state and engine of each thread
+        self._lock = threading.Lock()
+
+    def get_session(self) -> GuiSession:
+        """
+        Returns the logged-on session for the calling thread, reattaching or logging on again only
+        when needed. The session must only be used from the calling thread.
+        """
+        self._initialize_com()
+        with self._lock:
+            engine: SAPGuiEngine | None = getattr(self._local, "engine", None)
+            if engine is None:
+                engine = self._local.engine = self._create_engine()
+
+            try:
+                user = engine.session.get_user()
+            except Exception as e:
+                log.warning(f"SAP session is no longer available, reattaching: {e}")
+                engine = self._local.engine = self._create_engine()
+                user = engine.session.get_user()
+
+            if not user:
+                log.info("SAP session is logged off, logging on")
+                engine.login(self.username, self.password)
+
+            return engine.session
+
+    def release(self) -> None:
+        """Drops the engine of the calling thread and uninitializes COM, e.g. before the thread ends."""
+        self._local.engine = None
+        if getattr(self._local, "com_initialized", False):
+            pythoncom.CoUninitialize()
+            self._local.com_initialized = False
+
+    def warm_up(self) -> None:
+        """
+        Starts SAP Logon and logs on ahead of the first job, from its own thread. A failure is retried
+        by the first SAP job.
+        """
+        try:
+            self.get_session()
+            log.info("SAP session is ready")
+        except Exception as e:
+            log.error(f"Failed to prepare the SAP session: {e}")
+        finally:
+            self.release()
+
+    def _initialize_com(self) -> None:
+        # Worker threads are not COM initialized, the scripting objects need a single-threaded apartment
+        if not getattr(self._local, "com_initialized", False):
+            pythoncom.CoInitialize()
+            self._local.com_initialized = True
+
+    def _create_engine(self) -> SAPGuiEngine:
+        # Launches SAP Logon if needed and attaches to the connection, opening it if needed
+        return SAPGuiEngine(
+            connection_name=self.connection_name,
+            window_title=self.window_title,
+            executable_path=self.executable_path,
+        )
+
+
+sap_session = SAPSessionProvider(
+    connection_name=config.sap.connection_name,
+    window_title=config.sap.window_title,
+    executable_path=config.sap.executable_path,
+    username=config.sap.username,
+    password=config.sap.password,
+)
@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+from typing import Any
+import httpx
+import psycopg
+from psycopg.types.json import Jsonb
+from app.db.results import INSERT_RESULT_QUERY
+from app.db.timings import UPDATE_TIMINGS_QUERY
+from app.email.wmill_client import Windmill
+from app.models import JobResult
+
+
+@dataclass
+class SpooledResult:
+    id: str  # Name of the spool file, stable across retries so receivers can deduplicate
+    result: JobResult
+
+    def to_json(self) -> dict[str, Any]:
+        return {"id": self.id, **self.result.model_dump(mode="json")}
+
+
+class ResultSink:
+    """
+    Destination of job results. Sinks are called from their own background thread with batches of results.
+    `publish` must raise when the batch was not delivered, the batch is then retried with backoff.
+    """
+
+    name: str = "sink"
+
+    def publish(self, batch: list[SpooledResult]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PostgresSink(ResultSink):
+    """Writes results to the results table and folds succeeded jobs into the task timings aggregate."""
+
+    name = "postgres"
+
+    def __init__(self, conninfo: str, timing_smoothing: float = 0.2):
+        self.conninfo = conninfo
+        self.timing_smoothing = timing_smoothing
+        self._connection: psycopg.Connection | None = None
+
+    def publish(self, batch: list[SpooledResult]) -> None:
+        params = [
+            {
+                "job_id": item.result.id,
+                "task_name": item.result.task_name,
+                "status": item.result.status,
+                "worker_id": item.result.worker_id,
+                "worker_name": item.result.worker_name,
+                "data": Jsonb(item.result.model_dump(mode="json")["data"]),
+                "duration": item.result.duration,
+                "units": item.result.units,
+                "units_duration": item.result.units_duration,
+            }
+            for item in batch
+        ]
+        timings = [
+            self._timing_params(item.result)
+            for item in batch
+            if item.result.status == "succeeded" and item.result.duration is not None
+        ]
+        try:
+            connection = self._get_connection()
+            with connection.transaction():
+                with connection.cursor() as cursor:
+                    cursor.executemany(INSERT_RESULT_QUERY, params)
+                    if timings:
+                        cursor.executemany(UPDATE_TIMINGS_QUERY, timings)
+        except Exception:
+            self.close()
+            raise
+
+    def _timing_params(self, result: JobResult) -> dict[str, Any]:
+        units_duration = result.units_duration or 0.0
+        return {
+            "task_name": result.task_name,
+            # Time not spent on units, e.g. logging in and reading the input file
+            "job_seconds": max(0.0, result.duration - units_duration),
+            "unit_seconds": units_duration / result.units if result.units else None,
+            "units": result.units,
+            "alpha": self.timing_smoothing,
+        }
+
+    def _get_connection(self) -> psycopg.Connection:
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg.connect(self.conninfo, autocommit=True)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+
+class WebhookSink(ResultSink):
+    """POSTs each batch as {"results": [...]} to a URL. Any non-2xx response is retried."""
+
+    name = "webhook"
+
+    def __init__(
+        self, url: str, headers: dict[str, str] | None = None, timeout: float = 10.0
+    ):
+        self.url = url
+        self.client = httpx.Client(headers=headers or {}, timeout=timeout)
+
+    def publish(self, batch: list[SpooledResult]) -> None:
+        response = self.client.post(
+            self.url, json={"results": [item.to_json() for item in batch]}
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class WindmillSink(ResultSink):
+    """Runs a Windmill script or flow with each batch as its `results` argument."""
+
+    name = "windmill"
+
+    def __init__(self, instance_url: str, token: str, run_path: str):
+        self.instance_url = instance_url
+        self.token = token
+        self.run_path = run_path  # e.g. w/<workspace>/jobs/run/p/<script path>
+        self._client: Windmill | None = None
+
+    def publish(self, batch: list[SpooledResult]) -> None:
+        if self._client is None:
+            self._client = Windmill(self.instance_url, self.token)
+        self._client.post(
+            self.run_path, json={"results": [item.to_json() for item in batch]}
+        )
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.client.close()
+            self._client = None
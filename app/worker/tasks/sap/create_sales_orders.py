@@ -1,7 +1,10 @@
 import polars as pl
 import re
+import shutil
+import time
 from procrastinate import JobContext
-from typing import Any
+from procrastinate.utils import async_to_sync
+from typing import Any, Callable
 from pathlib import Path
 from tenacity import (
     retry,
@@ -10,12 +13,18 @@ from tenacity import (
     Retrying,
     RetryError,
 )
+from app.db import shards as shards_db
 from app.logging import log
-from app.worker.core import task
+from app.worker.batching import in_batch, run_batch
+from app.worker.core import configure_task_for, task
+from app.worker.ledger import SalesOrderLedger, hash_file
+from app.worker.metrics import record_sap_action
+from app.worker.sap_session import sap_session
+from app.worker.timings import record_unit
 from app.config import config
-from app.sap_gui import SAPGuiEngine, VKey, GuiSession
+from app.sap_gui import VKey, GuiSession
 from rpatoolkit.df import read_excel
-from .mappings import (
+from app.mappings import (
     ScreenOrder,
     Screen,
     ActionType,
@@ -56,35 +65,45 @@ def safe_filename(s: str, max_length: int = 150) -> str:
 
 
 # For all the tasks going in the same queue, you must use the same lock for all task if you want them to execute sequentially.
+# The host lock keeps the SAP GUI of a desktop to one job at a time, whatever the lock scope.
 # All tasks first parameter must be the JobContext
-@task(name="create_sales_orders", pass_context=True, lock="sap", queue="sap")
+@task(
+    name="create_sales_orders",
+    pass_context=True,
+    lock=config.sap.job_lock,
+    host_lock="sap",
+    queue="sap",
+)
 def create_sales_orders(
     context: JobContext,
     po_working_path: str,
     va01_details: dict[str, Any],
     screen_order: list[dict[str, Any]],
+    chunk_size: int | None = None,
 ):
-    log.info("Converting screen_order to list of ScreenOrder objects...")
-    screen_order_objects = [
-        ScreenOrder(
-            name=screen.get("name"),
-            post_actions=[Action(**action) for action in screen.get("post_actions")]
-            if isinstance(screen.get("post_actions"), list)
-            else Action(**screen.get("post_actions")),
-        )
-        if isinstance(screen, dict)
-        else ScreenOrder(name=screen)
-        for screen in screen_order
-    ]
+    """
+    Creates the sales orders of a PO working file in SAP.
+
+    With `chunk_size`, a file with more sales orders is sharded instead: this job only splits the sales
+    orders into chunk jobs run in parallel by the SAP workers, and the last chunk defers `merge_sales_orders`.
+
+    Created sales orders are recorded in the ledger of the file as they are created, so running the job
+    again for the same file resumes at the first sales order group not created yet.
+
+    A small file is followed by the small files deferred around the same time with the same VA01 details
+    and screen order, run back-to-back in the same SAP session. Each of them keeps its own job, result
+    and output files. See `WORKER_SAP_BATCH_WINDOW`.
+    """
+    screen_order_objects = parse_screen_order(screen_order)
 
     log.info("Checking if PO working file exists...")
-    po_working_path = validate_and_merge_base_path(
+    po_working_file = validate_and_merge_base_path(
         config.worker.network_drive_letter, po_working_path
     )
 
     log.info("Reading the po working file...")
     df = read_excel(
-        po_working_path, drop_empty_cols=False, drop_empty_rows=False
+        po_working_file, drop_empty_cols=False, drop_empty_rows=False
     ).collect()
     df = insert_sales_order_col(df)
 
@@ -93,25 +112,149 @@ def create_sales_orders(
 
     total_sales_orders = len(sales_orders)
     log.info("Total sales orders to be created: {}", total_sales_orders)
+    file_hash = hash_file(po_working_file)
+
+    if chunk_size and total_sales_orders > chunk_size:
+        return shard_sales_orders(
+            context,
+            po_working_path,
+            po_working_file,
+            df.schema,
+            sales_orders,
+            chunk_size,
+            file_hash=file_hash,
+            va01_details=va01_details,
+            screen_order=screen_order,
+        )
+
+    ledger = open_ledger(context, file_hash, sales_orders)
+    output_path = po_working_file.with_suffix(".updated.xlsx")
+    error_path = po_working_file.with_suffix(".errors.xlsx")
+    error_list = process_sales_orders(
+        sap_session.get_session(),
+        sales_orders,
+        df.schema,
+        po_working_file,
+        va01_details,
+        screen_order_objects,
+        total_sales_orders,
+        output_path=output_path,
+        error_path=error_path,
+        write=write_workbook,
+        ledger=ledger,
+    )
+    result = summarize_sales_orders(
+        total_sales_orders, error_list, output_path, error_path
+    )
+
+    if (
+        config.worker.sap_batch_window > 0
+        and not in_batch()
+        and total_sales_orders <= config.worker.sap_batch_max_units
+    ):
+        batched_job_ids = run_batch(
+            context,
+            match={
+                "va01_details": va01_details,
+                "screen_order": screen_order,
+                "chunk_size": None,
+            },
+            window=config.worker.sap_batch_window,
+            max_jobs=config.worker.sap_batch_max_jobs,
+            max_units=config.worker.sap_batch_max_units,
+        )
+        if batched_job_ids:
+            result["batched_job_ids"] = batched_job_ids
+
+    return result
+
+
+def parse_post_actions(
+    post_actions: list[dict[str, Any]] | dict[str, Any] | None,
+) -> list[Action] | Action | None:
+    if post_actions is None:
+        return None
+    if isinstance(post_actions, list):
+        return [Action(**action) for action in post_actions]
+    return Action(**post_actions)
 
-    sap = init_sap_and_login()
 
+def parse_screen_order(screen_order: list[dict[str, Any]]) -> list[ScreenOrder]:
+    log.info("Converting screen_order to list of ScreenOrder objects...")
+    return [
+        ScreenOrder(
+            name=screen.get("name"),
+            post_actions=parse_post_actions(screen.get("post_actions")),
+        )
+        if isinstance(screen, dict)
+        else ScreenOrder(name=screen)
+        for screen in screen_order
+    ]
+
+
+def open_ledger(
+    context: JobContext, file_hash: str, sales_orders: dict[int, list[dict[str, Any]]]
+) -> SalesOrderLedger:
+    """Loads the ledger of the file. Failing to load it fails the job rather than risk duplicate orders."""
+    ledger = SalesOrderLedger(
+        context.app.connector,
+        file_hash,
+        job_id=context.job.id,
+        max_age=config.worker.sales_order_ledger_ttl,
+    )
+    ledger.load()
+    resumed = sum(1 for so_count in sales_orders if ledger.get(so_count))
+    if resumed:
+        log.info(
+            f"Resuming: {resumed} of {len(sales_orders)} sales orders were already created"
+        )
+    return ledger
+
+
+def process_sales_orders(
+    session: GuiSession,
+    sales_orders: dict[int, list[dict[str, Any]]],
+    schema: pl.Schema,
+    po_working_path: Path,
+    va01_details: dict[str, Any],
+    screen_order_objects: list[ScreenOrder],
+    total_sales_orders: int,
+    output_path: Path,
+    error_path: Path,
+    write: Callable[[pl.DataFrame, Path], None],
+    ledger: SalesOrderLedger | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Creates the sales orders one by one, rewriting the output and error files after each one.
+
+    Groups found in the ledger are not created again, they are written to the output with their recorded
+    sales order number. Every created sales order is recorded in the ledger right away.
+
+    Returns the errors, one per failed sales order.
+    """
     # Create an empty output dataframe with the same schema as the input dataframe
-    output_df = pl.DataFrame(schema=df.schema)
+    output_df = pl.DataFrame(schema=schema)
     error_df = pl.DataFrame(
-        schema=df.schema
+        schema=schema
     )  #  Send as attachment if some so creation fails
     error_list = []  # PO Number and Screenshot Path
     for so_count, line_items in sales_orders.items():
         log.info(f"Creating sales order {so_count} of {total_sales_orders}")
+        so_started_at = time.perf_counter()
 
-        so_number = None
+        so_number = ledger.get(so_count) if ledger else None
+        resumed = so_number is not None
         error_message = None
 
         try:
-            so_number = va01(
-                sap.session, line_items, va01_details, screen_order_objects
-            )
+            if resumed:
+                log.info(f"Sales order {so_count} was already created: {so_number}")
+            else:
+                so_number = va01(
+                    session, line_items, va01_details, screen_order_objects
+                )
+                if ledger and so_number:
+                    ledger.record(so_count, line_items[0].get("po number"), so_number)
         except Exception as e:
             error_message = str(e)
             log.error(
@@ -122,7 +265,7 @@ def create_sales_orders(
                 e=e,
             )
             screenshot_path = f"{po_working_path.parent}/screenshot_{so_count}_{line_items[0].get('po number')}_{safe_filename(error_message)}.png"
-            sap.session.take_screenshot(screenshot_path, window=1, format="png")
+            session.take_screenshot(screenshot_path, window=1, format="png")
             log.info(f"Screenshot saved to {screenshot_path}")
             error_list.append(
                 {
@@ -146,18 +289,31 @@ def create_sales_orders(
 
             # Append this updated dataframe to the main output or error df
             df_to_write = error_df if error_message else output_df
-            suffix = ".errors.xlsx" if error_message else ".updated.xlsx"
-
             df_to_write.extend(df)
-            output_path = po_working_path.with_suffix(suffix)
-            df_to_write.write_excel(
-                output_path,
-                autofit=True,
-                dtype_formats={pl.Int64: "0"},
-                header_format={"bold": True, "bg_color": "yellow", "border": 1},
-                freeze_panes=(1, 2),  # First header row, and first two columns
-            )
+            write(df_to_write, error_path if error_message else output_path)
+            if not resumed:
+                record_unit(time.perf_counter() - so_started_at)
+                record_sap_action()
+
+    return error_list
+
+
+def write_workbook(df: pl.DataFrame, path: Path) -> None:
+    df.write_excel(
+        path,
+        autofit=True,
+        dtype_formats={pl.Int64: "0"},
+        header_format={"bold": True, "bg_color": "yellow", "border": 1},
+        freeze_panes=(1, 2),  # First header row, and first two columns
+    )
+
 
+def summarize_sales_orders(
+    total_sales_orders: int,
+    error_list: list[dict[str, Any]],
+    output_path: Path,
+    error_path: Path,
+) -> dict[str, Any]:
     so_created = total_sales_orders - len(error_list)
     so_failed = len(error_list)
     log.info(
@@ -171,9 +327,262 @@ def create_sales_orders(
         "sales_orders_failed": so_failed,
         "error_list": error_list,
         "output_path": output_path,
-        "error_path": output_path.with_suffix(".errors.xlsx")
-        if len(error_list) > 0
-        else None,
+        "error_path": error_path if len(error_list) > 0 else None,
+    }
+
+
+# Chunk files of a sharded PO file live next to it, in <file>.chunks/
+SO_GROUP_COLUMN = "__sales_order_group"
+
+
+def get_chunks_dir(po_working_file: Path) -> Path:
+    return po_working_file.with_suffix(".chunks")
+
+
+def get_chunk_path(po_working_file: Path, chunk: int, kind: str = "input") -> Path:
+    return get_chunks_dir(po_working_file) / f"{chunk:04d}.{kind}.parquet"
+
+
+def shard_sales_orders(
+    context: JobContext,
+    po_working_path: str,
+    po_working_file: Path,
+    schema: pl.Schema,
+    sales_orders: dict[int, list[dict[str, Any]]],
+    chunk_size: int,
+    file_hash: str,
+    va01_details: dict[str, Any],
+    screen_order: list[dict[str, Any]],
+) -> dict[str, Any]:
+    """
+    Writes the sales order groups in chunks of `chunk_size` to parquet files and defers one chunk job
+    per file in the queue of this job, so the workbook is only parsed once.
+    """
+    groups = list(sales_orders.items())
+    chunks = [groups[i : i + chunk_size] for i in range(0, len(groups), chunk_size)]
+
+    get_chunks_dir(po_working_file).mkdir(exist_ok=True)
+    for chunk, chunk_groups in enumerate(chunks):
+        rows = [
+            {**row, SO_GROUP_COLUMN: so_count}
+            for so_count, line_items in chunk_groups
+            for row in line_items
+        ]
+        pl.DataFrame(rows, schema={**schema, SO_GROUP_COLUMN: pl.Int64}).write_parquet(
+            get_chunk_path(po_working_file, chunk)
+        )
+
+    parent_job_id = context.job.id
+    async_to_sync(
+        shards_db.create_shard, context.app.connector, parent_job_id, len(chunks)
+    )
+    job_ids = configure_task_for(
+        context,
+        name="create_sales_orders_chunk",
+        queue=context.job.queue,
+        priority=context.job.priority,
+        lock=config.sap.job_lock,
+    ).batch_defer(
+        *[
+            {
+                "parent_job_id": parent_job_id,
+                "po_working_path": po_working_path,
+                "chunk": chunk,
+                "total_sales_orders": len(sales_orders),
+                "file_hash": file_hash,
+                "va01_details": va01_details,
+                "screen_order": screen_order,
+            }
+            for chunk in range(len(chunks))
+        ]
+    )
+    log.info(f"Sharded {len(sales_orders)} sales orders into {len(chunks)} chunk jobs")
+    return {
+        "sharded": True,
+        "total_sales_orders": len(sales_orders),
+        "chunks": len(chunks),
+        "chunk_job_ids": job_ids,
+    }
+
+
+def read_chunk(path: Path) -> tuple[pl.Schema, dict[int, list[dict[str, Any]]]]:
+    """Reads a chunk file back into its schema and sales order groups, as `collect_sales_orders_data` returns them."""
+    df = pl.read_parquet(path)
+    sales_orders: dict[int, list[dict[str, Any]]] = {}
+    for row in df.iter_rows(named=True):
+        sales_orders.setdefault(row.pop(SO_GROUP_COLUMN), []).append(row)
+    return df.drop(SO_GROUP_COLUMN).schema, sales_orders
+
+
+@task(
+    name="create_sales_orders_chunk",
+    pass_context=True,
+    lock=config.sap.job_lock,
+    host_lock="sap",
+    queue="sap",
+)
+def create_sales_orders_chunk(
+    context: JobContext,
+    parent_job_id: int,
+    po_working_path: str,
+    chunk: int,
+    total_sales_orders: int,
+    file_hash: str,
+    va01_details: dict[str, Any],
+    screen_order: list[dict[str, Any]],
+):
+    """Creates the sales orders of one chunk of a sharded PO file. Deferred by `create_sales_orders`."""
+    try:
+        po_working_file = validate_and_merge_base_path(
+            config.worker.network_drive_letter, po_working_path
+        )
+        schema, sales_orders = read_chunk(get_chunk_path(po_working_file, chunk))
+        log.info(f"Creating {len(sales_orders)} sales orders of chunk {chunk}")
+        error_list = process_sales_orders(
+            sap_session.get_session(),
+            sales_orders,
+            schema,
+            po_working_file,
+            va01_details,
+            parse_screen_order(screen_order),
+            total_sales_orders,
+            output_path=get_chunk_path(po_working_file, chunk, "updated"),
+            error_path=get_chunk_path(po_working_file, chunk, "errors"),
+            write=pl.DataFrame.write_parquet,
+            ledger=open_ledger(context, file_hash, sales_orders),
+        )
+    except Exception as e:
+        # A chunk to be retried is not done yet, the fan-in waits for its final outcome
+        if context.task.get_retry_exception(exception=e, job=context.job) is None:
+            complete_chunk(
+                context,
+                parent_job_id,
+                po_working_path,
+                file_hash,
+                chunk,
+                "failed",
+                {"type": type(e).__name__, "message": str(e)},
+            )
+        raise
+
+    result = {"sales_orders": len(sales_orders), "error_list": error_list}
+    complete_chunk(
+        context, parent_job_id, po_working_path, file_hash, chunk, "succeeded", result
+    )
+    return result
+
+
+def complete_chunk(
+    context: JobContext,
+    parent_job_id: int,
+    po_working_path: str,
+    file_hash: str,
+    chunk: int,
+    status: str,
+    result: dict[str, Any],
+) -> None:
+    """Records the final outcome of the chunk, and defers the fan-in job if it was the last chunk."""
+    last = async_to_sync(
+        shards_db.complete_chunk,
+        context.app.connector,
+        parent_job_id,
+        chunk,
+        context.job.id,
+        status,
+        result,
+    )
+    if last:
+        configure_task_for(
+            context,
+            name="merge_sales_orders",
+            queue=context.job.queue,
+            priority=context.job.priority,
+        ).defer(
+            parent_job_id=parent_job_id,
+            po_working_path=po_working_path,
+            file_hash=file_hash,
+        )
+        log.info(f"All chunks of job {parent_job_id} are done, merge deferred")
+
+
+@task(name="merge_sales_orders", pass_context=True, queue="sap")
+def merge_sales_orders(
+    context: JobContext, parent_job_id: int, po_working_path: str, file_hash: str
+):
+    """
+    Fan-in of a sharded PO file: merges the chunk outputs into the .updated.xlsx and .errors.xlsx files
+    of the PO file, and the chunk results into one result. The sales orders of a chunk job that failed
+    as a whole are reported as failed, except those the ledger records as created before it failed.
+    """
+    po_working_file = validate_and_merge_base_path(
+        config.worker.network_drive_letter, po_working_path
+    )
+    chunk_results = async_to_sync(
+        shards_db.get_chunk_results, context.app.connector, parent_job_id
+    )
+    ledger = SalesOrderLedger(
+        context.app.connector, file_hash, max_age=config.worker.sales_order_ledger_ttl
+    )
+    if any(chunk_result["status"] != "succeeded" for chunk_result in chunk_results):
+        try:
+            ledger.load()
+        except Exception as e:
+            log.warning(f"Failed to load the ledger of job {parent_job_id}: {e}")
+
+    output_frames: list[pl.DataFrame] = []
+    error_frames: list[pl.DataFrame] = []
+    error_list: list[dict[str, Any]] = []
+    total_sales_orders = 0
+    for chunk_result in chunk_results:
+        chunk, result = chunk_result["chunk"], chunk_result["result"]
+        if chunk_result["status"] == "succeeded":
+            total_sales_orders += result["sales_orders"]
+            error_list.extend(result["error_list"])
+            for kind, frames in (("updated", output_frames), ("errors", error_frames)):
+                path = get_chunk_path(po_working_file, chunk, kind)
+                if path.exists():
+                    frames.append(pl.read_parquet(path))
+            continue
+
+        # The whole chunk failed, e.g. SAP was not available: only the sales orders recorded in the
+        # ledger before it failed were created
+        schema, sales_orders = read_chunk(get_chunk_path(po_working_file, chunk))
+        total_sales_orders += len(sales_orders)
+        created_rows, failed_rows = [], []
+        for so_group, line_items in sales_orders.items():
+            so_number = ledger.get(so_group)
+            rows = created_rows if so_number else failed_rows
+            rows.extend(
+                {**item, "sales order": so_number or result["message"]}
+                for item in line_items
+            )
+            rows.append({key: None for key in schema})
+            if not so_number:
+                error_list.append(
+                    {
+                        **result,
+                        "po number": line_items[0].get("po number", None),
+                        "screenshot_path": None,
+                    }
+                )
+        if created_rows:
+            output_frames.append(pl.DataFrame(created_rows, schema=schema))
+        if failed_rows:
+            error_frames.append(pl.DataFrame(failed_rows, schema=schema))
+
+    output_path = po_working_file.with_suffix(".updated.xlsx")
+    error_path = po_working_file.with_suffix(".errors.xlsx")
+    for frames, path in ((output_frames, output_path), (error_frames, error_path)):
+        if frames:
+            write_workbook(pl.concat(frames), path)
+
+    shutil.rmtree(get_chunks_dir(po_working_file), ignore_errors=True)
+    return {
+        **summarize_sales_orders(
+            total_sales_orders, error_list, output_path, error_path
+        ),
+        "parent_job_id": parent_job_id,
+        "chunks": len(chunk_results),
     }
 
 
@@ -400,16 +809,6 @@ def perform_entry_point_actions(session: GuiSession, screen: Screen):
 
 
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_fixed(3))
-def init_sap_and_login():
-    sap = SAPGuiEngine(
-        connection_name=config.sap.connection_name,
-        window_title=config.sap.window_title,
-        executable_path=config.sap.executable_path,
-    )
-    sap.login(config.sap.username, config.sap.password)
-    return sap
-
-
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_fixed(1))
 def collect_sales_orders_data(df: pl.DataFrame) -> dict[str, list[dict[str, Any]]]:
     sales_orders = {}
@@ -0,0 +1,54 @@
+import contextlib
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+
+@dataclass
+class JobTimings:
+    """Execution timings of the running job, collected by the task wrapper."""
+
+    started_at: float
+    units: int = 0
+    units_duration: float = 0.0
+    excluded: float = 0.0  # Time spent running other jobs, e.g. the jobs of a batch
+
+    @property
+    def duration(self) -> float:
+        return time.perf_counter() - self.started_at - self.excluded
+
+
+_current_timings: ContextVar[JobTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def start_job_timings() -> JobTimings:
+    timings = JobTimings(started_at=time.perf_counter())
+    _current_timings.set(timings)
+    return timings
+
+
+def record_unit(seconds: float) -> None:
+    """
+    Records the time spent on one unit of work of the running job, e.g. one sales order.
+
+    Tasks call it for each unit so that the time of waiting jobs can be predicted from their number of units.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.units += 1
+        timings.units_duration += seconds
+
+
+@contextlib.contextmanager
+def exclude_from_timings() -> Iterator[None]:
+    """Leaves the time spent in the block out of the duration of the running job."""
+    timings = _current_timings.get()
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.excluded += time.perf_counter() - started_at
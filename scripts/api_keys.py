@@ -0,0 +1,79 @@
+import argparse
+import secrets
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.api.auth import hash_api_key
+from app.api.proc_app import app
+from app.db import apply_schema
+from app.db.api_keys import CREATE_KEY_QUERY, REVOKE_KEY_QUERY, LIST_KEYS_QUERY
+
+
+def create_key(owner: str, queues: list[str] | None, tasks: list[str] | None):
+    api_key = secrets.token_urlsafe(32)
+    with app.open():
+        apply_schema(app.connector)
+        row = app.connector.get_sync_connector().execute_query_one(
+            CREATE_KEY_QUERY,
+            key_hash=hash_api_key(api_key),
+            owner=owner,
+            allowed_queues=queues,
+            allowed_tasks=tasks,
+        )
+    print(
+        f"Created API key {row['id']} for {owner}. Store it now, it is not shown again:"
+    )
+    print(api_key)
+
+
+def revoke_key(key_id: int):
+    with app.open():
+        rows = app.connector.get_sync_connector().execute_query_all(
+            REVOKE_KEY_QUERY, id=key_id
+        )
+    if rows:
+        print(f"Revoked API key {key_id}. It stops working once API caches expire.")
+    else:
+        print(f"API key {key_id} not found or already revoked.")
+
+
+def list_keys():
+    with app.open():
+        rows = app.connector.get_sync_connector().execute_query_all(LIST_KEYS_QUERY)
+    for row in rows:
+        state = f"revoked at {row['revoked_at']}" if row["revoked_at"] else "active"
+        print(
+            f"{row['id']}\t{row['owner']}\tqueues={row['allowed_queues'] or 'all'}"
+            f"\ttasks={row['allowed_tasks'] or 'all'}\t{state}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage API keys")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Create a new API key")
+    create_parser.add_argument("owner", help="Owner of the key")
+    create_parser.add_argument(
+        "--queue", action="append", dest="queues", help="Allowed queue (repeatable)"
+    )
+    create_parser.add_argument(
+        "--task", action="append", dest="tasks", help="Allowed task (repeatable)"
+    )
+
+    revoke_parser = subparsers.add_parser("revoke", help="Revoke an API key")
+    revoke_parser.add_argument("id", type=int, help="Id of the key")
+
+    subparsers.add_parser("list", help="List API keys")
+
+    args = parser.parse_args()
+    if args.command == "create":
+        create_key(args.owner, args.queues, args.tasks)
+    elif args.command == "revoke":
+        revoke_key(args.id)
+    elif args.command == "list":
+        list_keys()
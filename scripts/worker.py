@@ -1,6 +1,12 @@
+import asyncio
+import threading
 from app.logging import log
-from app.worker.core import app
+from app.worker.core import app, result_publisher, heartbeat
+from app.worker.metrics import start_metrics_server
+from app.worker.runner import run_queue_workers
+from app.worker.sap_session import sap_session
 from app.config import config
+from app.db import apply_schema as apply_app_schema
 import logging
 
 logging.basicConfig(level=logging.DEBUG if config.is_dev else logging.WARNING)
@@ -10,11 +16,34 @@ def run_worker():
     log.info("Starting worker...")
     validate_configs()
     apply_schema()
-    app.run_worker(
-        concurrency=config.worker.concurrency,
-        name=config.worker.name,
-        queues=config.worker.queues,
-    )
+    if config.worker.metrics_port:
+        start_metrics_server(config.worker.metrics_port, config.worker.metrics_host)
+    result_publisher.start()
+    heartbeat.start()
+    if config.worker.serves_sap():
+        # Logs on in the background, the task threads then attach to the logged-on session
+        threading.Thread(
+            target=sap_session.warm_up, name="sap-warm-up", daemon=True
+        ).start()
+    try:
+        if config.worker.queue_concurrency:
+            asyncio.run(
+                run_queue_workers(
+                    app,
+                    config.worker.queue_concurrency,
+                    pool_sizes=config.worker.queue_pool_size,
+                    name=config.worker.name,
+                )
+            )
+        else:
+            app.run_worker(
+                concurrency=config.worker.concurrency,
+                name=config.worker.name,
+                queues=config.worker.queues,
+            )
+    finally:
+        heartbeat.stop()
+        result_publisher.stop()
 
 
 def apply_schema():
@@ -24,6 +53,11 @@ def apply_schema():
         except Exception:
             log.warning("Schema already applied or failed to apply schema")
 
+        try:
+            apply_app_schema(app.connector)
+        except Exception as e:
+            log.warning(f"Failed to apply desktop agent schema: {e}")
+
 
 def validate_configs():
     if not config.worker.validate_config():
@@ -34,6 +68,19 @@ def validate_configs():
         log.error("SAP configuration is invalid. Exiting.")
         exit(1)
 
+    if config.worker.sap_batch_window > 0 and config.sap.lock_scope == "global":
+        # The running job holds the global SAP lock, so no other SAP job could ever join its batch
+        log.error(
+            "WORKER_SAP_BATCH_WINDOW must be 0 when SAP_LOCK_SCOPE is global. Exiting."
+        )
+        exit(1)
+
+    if "windmill" in config.worker.result_sinks and not config.wmill.validate_config():
+        log.error(
+            "Windmill configuration is invalid for the windmill result sink. Exiting."
+        )
+        exit(1)
+
 
 if __name__ == "__main__":
     run_worker()